@@ -8,4 +8,9 @@ source prod_env.txt
 kill $(pgrep flask)
 source venv/bin/activate
 pip install -r webserver/requirements.txt
+# do not start the new code against a schema it was not migrated to
+if ! python -m webserver.database.migrate; then
+    echo "Migration failed, the webserver was not started"
+    exit 1
+fi
 nohup flask run &> webserver.out &
\ No newline at end of file
@@ -1,20 +1,165 @@
-import { CalendarIcon, DownloadIcon, ExternalLinkIcon } from '@chakra-ui/icons';
 import {
   Box,
+  Button,
   Center,
   ChakraProvider,
+  HStack,
+  Tab,
+  Table,
+  TabList,
+  TabPanel,
+  TabPanels,
+  Tabs,
+  Tbody,
+  Td,
+  Text,
+  Th,
+  Thead,
+  Tr,
   theme,
-  useColorModeValue,
 } from '@chakra-ui/react';
 import React, {useEffect, useRef, useState} from 'react';
-import { useNavigate, useParams } from "react-router-dom";
+import { useNavigate } from "react-router-dom";
 import TagManager from 'react-gtm-module'
 import _ from "lodash";
 
 import { Header } from '../components/Header';
 import { Footer } from '../components/Footer';
-import { checkLogin, getAuthHeader, getData } from '../utils';
+import { checkLogin, getData } from '../utils';
 
+const PAGE_SIZE = 25;
+
+const PLAYER_COLUMNS = [
+  { key: 'games_played', label: 'GP' },
+  { key: 'goals', label: 'G' },
+  { key: 'assists', label: 'A' },
+  { key: 'points', label: 'Pts' },
+  { key: 'power_play_goals', label: 'PPG' },
+  { key: 'short_handed_goals', label: 'SHG' },
+  { key: 'game_winning_goals', label: 'GWG' },
+];
+
+const GOALIE_COLUMNS = [
+  { key: 'games_played', label: 'GP' },
+  { key: 'shots', label: 'Shots' },
+  { key: 'save_percentage', label: 'Save %' },
+  { key: 'goals_against_average', label: 'GAA' },
+  { key: 'wins', label: 'W' },
+  { key: 'shutouts', label: 'SO' },
+];
+
+function StandingsTables() {
+
+  const [standings, setStandings] = useState(null);
+
+  useEffect(() => {
+    getData('/api/standings', setStandings);
+  }, []);
+
+  if (standings == null) {
+    return <Text>Loading...</Text>;
+  }
+
+  if (standings.levels.length == 0) {
+    return <Text>No standings yet this season</Text>;
+  }
+
+  return (
+    <Box>
+      {standings.levels.map(level => (
+        <Box key={level.level} mb="30px">
+          <Text fontWeight="bold" mb="10px">{level.level}</Text>
+          <Table size="sm">
+            <Thead>
+              <Tr>
+                <Th>Team</Th>
+                <Th isNumeric>GP</Th>
+                <Th isNumeric>W</Th>
+                <Th isNumeric>L</Th>
+                <Th isNumeric>T</Th>
+                <Th isNumeric>SOW</Th>
+                <Th isNumeric>SOL</Th>
+                <Th isNumeric>Pts</Th>
+                <Th isNumeric>GF</Th>
+                <Th isNumeric>GA</Th>
+                <Th isNumeric>Diff</Th>
+                <Th>Streak</Th>
+              </Tr>
+            </Thead>
+            <Tbody>
+              {level.teams.map(team => (
+                <Tr key={team.team_id}>
+                  <Td>{team.team}</Td>
+                  <Td isNumeric>{team.games_played}</Td>
+                  <Td isNumeric>{team.wins}</Td>
+                  <Td isNumeric>{team.losses}</Td>
+                  <Td isNumeric>{team.ties}</Td>
+                  <Td isNumeric>{team.shootout_wins}</Td>
+                  <Td isNumeric>{team.shootout_losses}</Td>
+                  <Td isNumeric>{team.points}</Td>
+                  <Td isNumeric>{team.goals_for}</Td>
+                  <Td isNumeric>{team.goals_against}</Td>
+                  <Td isNumeric>{team.goal_differential}</Td>
+                  <Td>{team.streak}</Td>
+                </Tr>
+              ))}
+            </Tbody>
+          </Table>
+        </Box>
+      ))}
+    </Box>
+  );
+}
+
+function StatsTable({ type, columns }) {
+
+  const [page, setPage] = useState(1);
+  const [stats, setStats] = useState(null);
+
+  useEffect(() => {
+    getData(`/api/stats?type=${type}&page=${page}&per_page=${PAGE_SIZE}`, setStats);
+  }, [type, page]);
+
+  if (stats == null) {
+    return <Text>Loading...</Text>;
+  }
+
+  if (stats.total == 0) {
+    return <Text>No stats yet this season</Text>;
+  }
+
+  const pageCount = Math.ceil(stats.total / PAGE_SIZE);
+
+  return (
+    <Box>
+      <Table size="sm">
+        <Thead>
+          <Tr>
+            <Th>#</Th>
+            <Th>Name</Th>
+            <Th>Team</Th>
+            {columns.map(column => <Th key={column.key} isNumeric>{column.label}</Th>)}
+          </Tr>
+        </Thead>
+        <Tbody>
+          {stats.stats.map((row, index) => (
+            <Tr key={`${row.team_id}-${row.name}`}>
+              <Td>{(page - 1) * PAGE_SIZE + index + 1}</Td>
+              <Td>{row.name}</Td>
+              <Td>{row.team}</Td>
+              {columns.map(column => <Td key={column.key} isNumeric>{row[column.key]}</Td>)}
+            </Tr>
+          ))}
+        </Tbody>
+      </Table>
+      <HStack mt="10px" justify="center">
+        <Button size="xs" isDisabled={page <= 1} onClick={() => setPage(page - 1)}>Previous</Button>
+        <Text fontSize="sm">Page {page} of {pageCount}</Text>
+        <Button size="xs" isDisabled={page >= pageCount} onClick={() => setPage(page + 1)}>Next</Button>
+      </HStack>
+    </Box>
+  );
+}
 
 export default function Schedule() {
 
@@ -40,8 +185,27 @@ export default function Schedule() {
   return (
     <ChakraProvider theme={theme}>
       <Header react_navigate={navigate} signed_in={_.has(user, 'user_id', false)}></Header>
-      <Center height='80vh'>
-        <iframe overflow='hidden' height='100%' width='100%' src="https://stats.sharksice.timetoscore.com/display-stats.php?league=1" title="W3Schools Free Online Web Tutorials"></iframe>
+      <Center>
+        <Box width="100%" maxWidth="900px" mx="20px" minHeight="80vh">
+          <Tabs>
+            <TabList>
+              <Tab>Standings</Tab>
+              <Tab>Players</Tab>
+              <Tab>Goalies</Tab>
+            </TabList>
+            <TabPanels>
+              <TabPanel>
+                <StandingsTables />
+              </TabPanel>
+              <TabPanel>
+                <StatsTable type="players" columns={PLAYER_COLUMNS} />
+              </TabPanel>
+              <TabPanel>
+                <StatsTable type="goalies" columns={GOALIE_COLUMNS} />
+              </TabPanel>
+            </TabPanels>
+          </Tabs>
+        </Box>
       </Center>
       <Footer></Footer>
     </ChakraProvider>
@@ -10,6 +10,8 @@ def create_app(testing=False):
     from webserver.api import profile
     from webserver.api import routes
     from webserver.api import signaturepdf
+    from webserver.api import standings
+    from webserver.api import stats
     from webserver.api import team
     from webserver.api.chat import blueprint as chat_blueprint
 
@@ -21,6 +23,8 @@ def create_app(testing=False):
     app.register_blueprint(routes.blueprint)
     app.register_blueprint(team.blueprint)
     app.register_blueprint(signaturepdf.blueprint)
+    app.register_blueprint(standings.blueprint)
+    app.register_blueprint(stats.blueprint)
     app.register_blueprint(chat_blueprint)
 
     from webserver.assistant import Assistant
@@ -29,6 +33,10 @@ def create_app(testing=False):
     from webserver.data_synchronizer import Synchronizer
     app.config['synchronizer'] = Synchronizer()
 
+    # compile the email templates up front, so a broken one fails startup instead of a send
+    from webserver.email import templates
+    templates.load_all()
+
     from webserver.logging import write_log
     import os
     if os.getenv('HOCKEY_REPLY_ENV') == 'prod':
@@ -185,7 +185,7 @@ def forgot_password():
     user.password_reset_token_expires_at = datetime.datetime.now() + datetime.timedelta(minutes=10)
     db.commit_changes()
 
-    webserver.email.send_forgot_password(request.json['email'], user.password_reset_token)
+    webserver.email.send_forgot_password(db, request.json['email'], user.password_reset_token)
 
     return { 'result' : 'success' }, 200
 
@@ -58,7 +58,7 @@ def get_games(team_id = None):
     db = get_db()
     upcomingOnly = 'upcomingOnly' in request.args
 
-    teams = []
+    team_ids = []
     if team_id is not None:
         team = db.get_team_by_id(int(team_id))
 
@@ -66,94 +66,61 @@ def get_games(team_id = None):
             write_log('ERROR', f'api/games: team {team_id} not found')
             return {'result': 'error'}, 400
 
-        teams.append(team)
+        team_ids.append(team.team_id)
     else:
         for team in get_current_user().teams:
-            teams.append(team)
+            team_ids.append(team.team_id)
 
-    for team in teams:
+    # The user's team memberships decide which side of each game is "theirs". Send user role
+    # to the front end for the case where the user has not been accepted to the team yet. In
+    # that case, it will hide the reply box.
+    user_id = get_current_user().user_id
+    user_roles = {}
+    for player in get_current_user().teams:
+        user_roles[player.team_id] = player.role
 
-        games = db.get_games_for_team(team.team_id)
+    # One query for the games with both team names, one for the reply counts of all of them
+    games = db.get_games_feed(team_ids, upcomingOnly)
+    reply_counts = db.game_reply_counts([game.game_id for game, _, _ in games], user_id)
 
-        for game in games:
-
-            if upcomingOnly and (game.completed == 1 or game.scheduled_at < datetime.now(timezone.utc)):
-                continue
-
-            home_team = db.get_team_by_id(game.home_team_id)
-            away_team = db.get_team_by_id(game.away_team_id)
+    pacific = ZoneInfo('US/Pacific')
+    now = datetime.now(timezone.utc).astimezone(pacific)
 
-            if home_team is None or away_team is None:
-                write_log('ERROR', f'/api/game/<game>: Team for game {game.game_id} is not found')
-                return {'result': 'error'}, 400
+    for game, home_team_name, away_team_name in games:
 
-            if game.home_team_id != team.team_id and game.away_team_id != team.team_id:
-                write_log('ERROR', f'/api/game/<game>: Team ({team.team_id}) is not in game {game.game_id}')
-                return {'result': 'error'}, 400
+        if home_team_name is None or away_team_name is None:
+            write_log('ERROR', f'/api/game/<game>: Team for game {game.game_id} is not found')
+            return {'result': 'error'}, 400
 
-            user_is_home = False
-            if is_logged_in_user_in_team(game.home_team_id, False):
-                user_is_home = True
-
-            user_team_id = game.away_team_id if not user_is_home else game.home_team_id,
-
-            user_reply = ''
-            count_yes = 0
-            count_maybe = 0
-            count_no = 0
-            count_goalie = 0
-            replies = db.game_replies_for_game(game.game_id, user_team_id)
-
-            # Send user role to the front end for the case where the user has not been accepted
-            # to the team yet. In that case, it will hide the reply box.
-            user_role = ''
-            user_team = db.get_team_by_id(user_team_id)
-            for player in user_team.players:
-                if player.user_id == get_current_user().user_id:
-                    user_role = player.role
-
-            for reply in replies:
-                if reply.user_id == get_current_user().user_id:
-                    user_reply = reply.response
-                if reply.response == 'yes':
-
-                    if reply.is_goalie:
-                        count_goalie = 1
-                    else:
-                        count_yes += 1 # exclude goalies from main YES count
-
-                if reply.response == 'no':
-                    count_no += 1
-                if reply.response == 'maybe':
-                    count_maybe += 1
-
-
-            pacific = ZoneInfo('US/Pacific')
-            game_dict = {
-                'game_id' : game.game_id,
-                'scheduled_at_dt': game.scheduled_at,
-                'scheduled_at': game.scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p"),
-                'scheduled_how_soon': timeuntil(datetime.now(timezone.utc).astimezone(pacific), game.scheduled_at.astimezone(pacific)).replace(' ', ' '),
-                'completed': game.completed,
-                'rink': game.rink,
-                'level': game.level,
-                'home_team_id': game.home_team_id,
-                'away_team_id': game.away_team_id,
-                'user_team': home_team.name if user_is_home else away_team.name,
-                'vs': home_team.name if not user_is_home else away_team.name,
-                'user_team_id': user_team_id,
-                'home_goals': game.home_goals,
-                'away_goals': game.away_goals,
-                'game_type': game.game_type,
-                'user_reply': user_reply,
-                'user_role': user_role,
-                'count_yes': count_yes,
-                'count_no': count_no,
-                'count_maybe': count_maybe,
-                'count_goalie': count_goalie
-            }
-            result['games'].append(game_dict)
-            result['games'] = sorted(result['games'], key=lambda game: game['scheduled_at_dt'])
+        user_is_home = current_app.config['TESTING'] or game.home_team_id in user_roles
+
+        user_team_id = game.away_team_id if not user_is_home else game.home_team_id
+        counts = reply_counts.get((game.game_id, user_team_id), {})
+
+        game_dict = {
+            'game_id' : game.game_id,
+            'scheduled_at_dt': game.scheduled_at,
+            'scheduled_at': game.scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p"),
+            'scheduled_how_soon': timeuntil(now, game.scheduled_at.astimezone(pacific)).replace(' ', ' '),
+            'completed': game.completed,
+            'rink': game.rink,
+            'level': game.level,
+            'home_team_id': game.home_team_id,
+            'away_team_id': game.away_team_id,
+            'user_team': home_team_name if user_is_home else away_team_name,
+            'vs': home_team_name if not user_is_home else away_team_name,
+            'user_team_id': user_team_id,
+            'home_goals': game.home_goals,
+            'away_goals': game.away_goals,
+            'game_type': game.game_type,
+            'user_reply': counts.get('user_reply', ''),
+            'user_role': user_roles.get(user_team_id, ''),
+            'count_yes': counts.get('count_yes', 0),
+            'count_no': counts.get('count_no', 0),
+            'count_maybe': counts.get('count_maybe', 0),
+            'count_goalie': counts.get('count_goalie', 0)
+        }
+        result['games'].append(game_dict)
 
     return make_response(result)
 
@@ -357,12 +324,7 @@ def game_reply(game_id, team_id):
                 write_log('ERROR', f'api/reply: {get_current_user().user_id} does not have access to edit reply for {user_id}')
                 return {'result': 'error'}, 400
 
-        db.set_game_reply(game_id, team_id,
-                          user_id,
-                          response,
-                          message,
-                          is_goalie)
-
+        # queued first, so set_game_reply commits it with the reply
         if get_current_user().user_id != user_id and response != None and not is_anonymous_sub(user_id):
 
             user = db.get_user_by_id(user_id)
@@ -371,5 +333,11 @@ def game_reply(game_id, team_id):
 
             send_reply_was_changed(db, user, team, game, response, get_current_user())
 
+        db.set_game_reply(game_id, team_id,
+                          user_id,
+                          response,
+                          message,
+                          is_goalie)
+
         write_log('INFO', f'api/game/reply: {user_id} says {response} for game {game_id} set by {get_current_user().user_id}')
         return make_response({ 'result' : 'success' })
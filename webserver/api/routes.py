@@ -9,11 +9,11 @@ import sys
 
 from flask import Blueprint, current_app, g, make_response, request
 import jwt
+from webserver.api.auth import check_login
 from webserver.api.game import get_game
 from webserver.assistant import Assistant
-from webserver.data_synchronizer import Synchronizer
 from webserver.database.alchemy_models import User
-from webserver.database.hockey_db import get_db
+from webserver.database.hockey_db import get_db, get_current_user, identity_cache_stats
 from webserver.email import send_game_coming_soon
 from webserver.sms import SMS
 from webserver.logging import write_log
@@ -39,6 +39,50 @@ def test_sms(msg, number):
     sms_client.send([number], msg)
     return "", 200
 
+@blueprint.route('/admin/cache-stats')
+def cache_stats():
+    '''
+    Hit rates and sizes of the Team/User identity caches in this process. Admins only.
+    '''
+    if not check_login():
+        return { 'result' : 'needs login' }, 400
+
+    if not get_current_user().admin:
+        return { 'result' : 'not allowed' }, 401
+
+    return make_response(identity_cache_stats())
+
+@blueprint.route('/admin/sync-status')
+def sync_status():
+    '''
+    Current polling cadence of the synchronizer jobs and the reason for it. Admins only.
+    '''
+    if not check_login():
+        return { 'result' : 'needs login' }, 400
+
+    if not get_current_user().admin:
+        return { 'result' : 'not allowed' }, 401
+
+    return make_response(current_app.config['synchronizer'].status())
+
+@blueprint.route('/admin/sync-metrics')
+def sync_metrics():
+    '''
+    Stage timings, page fetches and game change counts of the recent league syncs run by this
+    process, oldest first. ?league=<id> limits them to one league, ?fetches includes every fetch
+    and parse instead of only the slowest. Admins only.
+    '''
+    if not check_login():
+        return { 'result' : 'needs login' }, 400
+
+    if not get_current_user().admin:
+        return { 'result' : 'not allowed' }, 401
+
+    league_id = request.args.get('league', type=int)
+    history = current_app.config['synchronizer'].metrics_history
+
+    return make_response(history.report(league_id, 'fetches' in request.args))
+
 @blueprint.route('/sync')
 def sync():
     '''
@@ -48,8 +92,7 @@ def sync():
     if os.getenv('HOCKEY_REPLY_ENV') == 'prod':
         return { 'result' : 'not allowed' }
     
-    synchronizer = Synchronizer()
-    synchronizer.sync()
+    current_app.config['synchronizer'].sync()
 
     return { 'result' : 'success' }
 
@@ -63,8 +106,20 @@ def sync_locker_rooms():
     if os.getenv('HOCKEY_REPLY_ENV') == 'prod':
         return { 'result' : 'not allowed' }
 
-    synchronizer = Synchronizer()
-    synchronizer.locker_room_assignment_check()
+    current_app.config['synchronizer'].locker_room_assignment_check()
+
+    return { 'result' : 'success' }
+
+@blueprint.route('/drain-email-outbox')
+def drain_email_outbox():
+    '''
+    Sends the queued emails now. The outbox job only runs on production, so this is how queued
+    emails go out when testing. Returns an error if accessed on production.
+    '''
+    if os.getenv('HOCKEY_REPLY_ENV') == 'prod':
+        return { 'result' : 'not allowed' }
+
+    current_app.config['synchronizer'].outbox.drain()
 
     return { 'result' : 'success' }
 
@@ -0,0 +1,88 @@
+'''
+standings
+
+API for the league standings, computed by the synchronizer from the completed games.
+'''
+import os
+import threading
+
+from cachetools import TTLCache
+from flask import Blueprint, make_response, request
+
+from webserver.database.hockey_db import get_db
+from webserver.logging import write_log
+
+blueprint = Blueprint('standings', __name__, url_prefix='/api')
+
+DEFAULT_LEAGUE_ID = 1
+
+# Standings only change when a sync applies completed games. Responses are cached in the process
+# and by browsers for STANDINGS_CACHE_SECONDS, which bounds how long a result takes to show up.
+STANDINGS_CACHE_SECONDS = int(os.getenv('HOCKEY_REPLY_STANDINGS_CACHE_SECONDS', 300))
+standings_cache = TTLCache(maxsize=64, ttl=STANDINGS_CACHE_SECONDS)
+standings_cache_lock = threading.Lock()
+
+def standing_dict(standing, team_name):
+    return {
+        'team_id': standing.team_id,
+        'team': team_name,
+        'games_played': standing.games_played,
+        'wins': standing.wins,
+        'losses': standing.losses,
+        'ties': standing.ties,
+        'shootout_wins': standing.shootout_wins,
+        'shootout_losses': standing.shootout_losses,
+        'points': standing.points,
+        'goals_for': standing.goals_for,
+        'goals_against': standing.goals_against,
+        'goal_differential': standing.goals_for - standing.goals_against,
+        'streak': f'{standing.streak_result}{standing.streak_length}' if standing.streak_result else None
+    }
+
+def load_standings(league_id, season, level):
+    db = get_db()
+    if season is None:
+        season = db.get_standings_season(league_id)
+
+    result = { 'league': league_id, 'season': season, 'levels': [] }
+    if season is None:
+        return result
+
+    for standing, team_name in db.get_standings(league_id, season, level):
+        if not result['levels'] or result['levels'][-1]['level'] != standing.level:
+            result['levels'].append({ 'level': standing.level, 'teams': [] })
+
+        result['levels'][-1]['teams'].append(standing_dict(standing, team_name))
+
+    return result
+
+@blueprint.route('/standings', methods=['GET'])
+def get_standings():
+    ''' Returns the standings of each level of a league season, teams in rank order.
+
+        Query parameters (all optional):
+            league: league id, defaults to 1
+            season: season number, defaults to the latest season with standings
+            level: only this level, e.g. Adult Division 7B
+    '''
+    try:
+        league_id = int(request.args.get('league', DEFAULT_LEAGUE_ID))
+        season = request.args.get('season', type=int)
+        level = request.args.get('level')
+    except ValueError as e:
+        write_log('INFO', f'get_standings bad query parameters {request.args}: {e}')
+        return { 'result' : 'error' }, 400
+
+    cache_key = (league_id, season, level)
+    with standings_cache_lock:
+        result = standings_cache.get(cache_key)
+
+    if result is None:
+        result = load_standings(league_id, season, level)
+
+        with standings_cache_lock:
+            standings_cache[cache_key] = result
+
+    response = make_response(result)
+    response.headers['Cache-Control'] = f'public, max-age={STANDINGS_CACHE_SECONDS}'
+    return response
@@ -0,0 +1,110 @@
+'''
+stats
+
+APIs for the player and goalie stats that the synchronizer copies from the Sharks Ice team pages.
+'''
+from flask import Blueprint, make_response, request
+
+from webserver.database.hockey_db import get_db
+from webserver.logging import write_log
+
+blueprint = Blueprint('stats', __name__, url_prefix='/api')
+
+DEFAULT_LEAGUE_ID = 1
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# stats are refreshed at most every sync, let browsers reuse a response for a few minutes
+CACHE_MAX_AGE_SECONDS = 300
+
+# sortable columns of each stats type -> whether larger values rank first. The first is the default.
+SORT_COLUMNS = {
+    'players': {
+        'points': True,
+        'goals': True,
+        'assists': True,
+        'games_played': True,
+        'power_play_goals': True,
+        'short_handed_goals': True,
+        'game_winning_goals': True,
+        'hat_tricks': True,
+        'name': False,
+    },
+    'goalies': {
+        'save_percentage': True,
+        'goals_against_average': False,
+        'wins': True,
+        'shutouts': True,
+        'games_played': True,
+        'shots': True,
+        'name': False,
+    }
+}
+
+HIDDEN_COLUMNS = ['league_id', 'updated_at']
+
+def stats_dict(stats, team_name):
+    result = {column.name: getattr(stats, column.name) for column in stats.__table__.columns
+              if column.name not in HIDDEN_COLUMNS}
+    result['team'] = team_name
+    return result
+
+@blueprint.route('/stats', methods=['GET'])
+def get_stats():
+    ''' Returns a page of league leaders, or of one team's stats when team_id is given.
+
+        Query parameters (all optional):
+            type: players (default) or goalies
+            league: league id, defaults to 1
+            season: season number, defaults to the latest season synced
+            team_id: only the stats of this team
+            sort: one of SORT_COLUMNS for the type
+            page, per_page: 1 based page number and page size (max 100)
+    '''
+    stats_type = request.args.get('type', 'players')
+    if stats_type not in SORT_COLUMNS:
+        write_log('INFO', f'get_stats unknown stats type {stats_type}')
+        return { 'result' : 'error' }, 400
+
+    sort = request.args.get('sort', next(iter(SORT_COLUMNS[stats_type])))
+    if sort not in SORT_COLUMNS[stats_type]:
+        write_log('INFO', f'get_stats can not sort {stats_type} by {sort}')
+        return { 'result' : 'error' }, 400
+
+    try:
+        league_id = int(request.args.get('league', DEFAULT_LEAGUE_ID))
+        season = request.args.get('season', type=int)
+        team_id = request.args.get('team_id', type=int)
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError as e:
+        write_log('INFO', f'get_stats bad query parameters {request.args}: {e}')
+        return { 'result' : 'error' }, 400
+
+    db = get_db()
+    if season is None:
+        season = db.get_stats_season(league_id)
+
+    result = {
+        'type': stats_type,
+        'league': league_id,
+        'season': season,
+        'team_id': team_id,
+        'sort': sort,
+        'page': page,
+        'per_page': per_page,
+        'total': 0,
+        'stats': []
+    }
+
+    if season is not None:
+        get_page = db.get_player_stats if stats_type == 'players' else db.get_goalie_stats
+        total, rows = get_page(league_id, season, team_id, sort, SORT_COLUMNS[stats_type][sort],
+                               (page - 1) * per_page, per_page)
+
+        result['total'] = total
+        result['stats'] = [stats_dict(stats, team_name) for stats, team_name in rows]
+
+    response = make_response(result)
+    response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE_SECONDS}'
+    return response
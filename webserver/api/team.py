@@ -222,11 +222,13 @@ def join_team():
                                     )
     join_team_as_player.player = user_to_add
     team.players.append(join_team_as_player)
+
+    # queued in the same transaction as the join
+    if player_role != 'captain':
+        send_player_join_request(db, join_team_as_player, team)
     db.commit_changes()
 
     write_log('INFO', f'api/join-team: {request.json["user_id"]} requested {team.name}')
-    if player_role != 'captain':
-        send_player_join_request(join_team_as_player, team)
 
     return make_response({ 'result' : 'success' })
 
@@ -271,6 +273,8 @@ def update_player_role():
     
         if player.user_id == request.json['user_id']:
 
+            was_pending, old_role, previous_updated_at = player.pending_status, player.role, player.updated_at
+
             if player.pending_status:
                 player.pending_status = False
                 player.joined_at = datetime.now()
@@ -282,10 +286,13 @@ def update_player_role():
             if 'role' in request.json and validate_role(request.json['role']):
                 player.role = request.json['role']
 
+            # resubmitting the same role is not a change to email about
+            if was_pending or player.role != old_role:
+                player.updated_at = datetime.now()
+                send_team_role_change(db, team, player, get_current_user(), previous_updated_at)
             db.commit_changes()
 
             write_log('INFO', f'api/player-role: {player.player.email} updated to {player.role} on {team.name} by {get_current_user().email}')
-            send_team_role_change(team, player, get_current_user())
 
             return make_response({ 'result' : 'success' })
 
@@ -395,11 +402,11 @@ def remove_player():
     who = get_current_user().email
 
     team.players.remove(player_to_remove)
+    if removed_user.user_id != get_current_user().user_id:
+        send_removed_from_team(db, team, player_to_remove, get_current_user())
     db.commit_changes()
 
     write_log('INFO', f'api/remove-player: {email} removed from {team.name} by {who}')
-    if removed_user.user_id != get_current_user().user_id:
-        send_removed_from_team(team, removed_user, get_current_user())
 
     return make_response({ 'result' : 'success' })
 
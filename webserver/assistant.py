@@ -192,6 +192,11 @@ def create_goalie_search_for_next_goalieless_game(team_id):
         if game.completed == 1 or game.scheduled_at < datetime.now(timezone.utc):
             continue
 
+        # the summary answers the common case (goalie already confirmed) without the replies
+        summary = db.get_game_reply_summary(game.game_id, team_id)
+        if summary and summary.count_goalie > 0:
+            continue
+
         replies = db.game_replies_for_game(game.game_id, team_id)
 
         goalie_confirmed = False
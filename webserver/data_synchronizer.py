@@ -4,37 +4,147 @@ data_synchronizer
 Top level class to pull data from the shark's ice web site, feed it into the html parsers, and use
 the parser output to update the database with the latest data.
 '''
+from concurrent.futures import ThreadPoolExecutor as FetchPoolExecutor
+import datetime
+import hashlib
 import os
-import requests
+import threading
+import time
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
-from bs4 import BeautifulSoup
 
 from webserver.database.hockey_db import Database, get_db
-from webserver.email import send_game_coming_soon
-from webserver.website_parsers import LockerRoomPageParser, TeamPageParser
+from webserver.email import send_game_time_changed, send_games_cancelled, send_games_coming_soon
+from webserver.email_outbox import OutboxWorker
+from webserver.http_client import DEFAULT_BREAKER, HttpClient
+from webserver.leader import LeaderElection
+from webserver.sync_metrics import SyncMetrics, SyncMetricsHistory
+from webserver.website_parsers import LockerRoomPageParser, TeamPageParser, make_soup
 from webserver.logging import print_log, write_log
 
+class FetchedPage:
+    ''' Result of a conditional download of a Sharks Ice page '''
+
+    CHANGED = 'changed'              # new content that needs to be parsed and applied
+    NOT_MODIFIED = 'not_modified'    # the site answered 304 to the conditional request
+    UNCHANGED = 'unchanged'          # downloaded, but the same as the version last applied
+
+    def __init__(self, url, status, content=None, etag=None, last_modified=None, content_hash=None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+
+    def fetch_state(self):
+        ''' (url, etag, last_modified, content_hash) as stored by Database.set_page_fetch_states '''
+        return (self.url, self.etag, self.last_modified, self.content_hash)
+
+class LeagueSync:
+    ''' State of one sync run of a league. Each run has its own db session, so leagues can be
+        synced concurrently and commit independently.
+    '''
+    def __init__(self, league_id):
+        self.league_id = league_id
+        self.db = Database()
+
+        self.synced_games = {}
+        self.synced_team_ids = set()
+        self.synced_stats = []
+        self.applied_pages = []
+        self.page_counts = {FetchedPage.CHANGED: 0, FetchedPage.NOT_MODIFIED: 0, FetchedPage.UNCHANGED: 0}
+        self.game_counts = {'parsed': 0, 'duplicates': 0, 'conflicts': 0}
+        self.metrics = SyncMetrics(league_id)
+
 class Synchronizer:
 
     SHARKS_ICE_BASE_URL = 'https://stats.sharksice.timetoscore.com/'
-    SHARKS_ICE_SEASON_ENDPOINTS = [
-        'display-stats.php?league=1',
-    ]
+    SHARKS_ICE_SEASON_ENDPOINT = 'display-stats.php?league={league_id}'
+    SHARKS_ICE_LEAGUES = [int(league_id) for league_id in os.getenv('HOCKEY_REPLY_SYNC_LEAGUES', '1').split(',')]
     SHARKS_ICE_TEAM_ENDPOINT = 'display-schedule'
     SHARKS_ICE_LOCKROOM_ENDPOINT = 'display-lr-assignments.php'
 
-    SYNCHRONIZE_INTERVAL_HOURS = 4
     NOTIFY_CHECK_INTERVAL_HOURS = 1
-    LOCKER_ROOM_INTERVAL_SECONDS = 15
 
-    def __init__(self):
+    # Every webserver process runs the scheduler, but only the elected leader has the jobs below.
+    # The others check every LEADER_CHECK_INTERVAL_SECONDS whether they need to take over.
+    LEADER_JOB_ID = 'leader'
+    LEADER_CHECK_INTERVAL_SECONDS = 30
+    NOTIFY_JOB_ID = 'notify'
+
+    # Each league is synced by its own job, every SYNCHRONIZE_INTERVAL_HOURS during the season.
+    # After each run the league's next one is moved earlier when its games are close or playoff
+    # brackets are resolving, and later in the off-season. At most
+    # SYNCHRONIZE_MAX_CONCURRENT_LEAGUES leagues sync at once.
+    SYNCHRONIZE_JOB_ID = 'sync-league-{league_id}'
+    SYNCHRONIZE_MAX_CONCURRENT_LEAGUES = 2
+    SYNCHRONIZE_INTERVAL_HOURS = 4
+    SYNCHRONIZE_GAMES_SOON_INTERVAL_HOURS = 1
+    SYNCHRONIZE_GAMES_SOON_WINDOW_HOURS = 48
+    SYNCHRONIZE_PLACEHOLDER_INTERVAL_MINUTES = 30
+    SYNCHRONIZE_OFF_SEASON_INTERVAL_HOURS = 24
+    SYNCHRONIZE_FAILED_RETRY_MINUTES = 30
+
+    # Locker rooms are posted shortly before games. The page is polled every
+    # LOCKER_ROOM_INTERVAL_SECONDS within LOCKER_ROOM_WINDOW_HOURS of a game that is missing its
+    # locker rooms, and backs off to at most LOCKER_ROOM_IDLE_INTERVAL_SECONDS otherwise.
+    LOCKER_ROOM_JOB_ID = 'locker_rooms'
+    LOCKER_ROOM_INTERVAL_SECONDS = 15
+    LOCKER_ROOM_WINDOW_HOURS = 3
+    LOCKER_ROOM_IDLE_INTERVAL_SECONDS = 60 * 60
+
+    # Emails queued by the API handlers are sent by the outbox job, on its own executor so they
+    # are not held up behind the notify job.
+    OUTBOX_JOB_ID = 'email_outbox'
+    OUTBOX_INTERVAL_SECONDS = 5
+
+    # Fetching from the Sharks Ice site. Team pages are downloaded concurrently, but never with
+    # more than FETCH_MAX_CONNECTIONS connections open to the site at once. Timeouts, retries and
+    # the circuit breakers are configured in http_client. Each league sync has its own breaker,
+    # named by the league id, and the locker room job has LOCKER_ROOM_BREAKER.
+    FETCH_MAX_CONNECTIONS = 4
+    LOCKER_ROOM_BREAKER = 'locker_rooms'
+
+    # league sync runs kept for the admin sync metrics endpoint
+    METRICS_HISTORY_RUNS = 50
+
+    # A team losing more upcoming games than this in one sync looks like a broken page rather
+    # than cancellations. The games are still flagged as deleted (they come back if the site lists
+    # them again), but nobody is emailed about them.
+    CANCELLED_GAMES_NOTIFY_LIMIT = 3
+
+    def __init__(self, transport=None, notify_changes=True, leader=None):
+        ''' transport replaces the http session under the HttpClient used for every fetch, e.g.
+            with one of the sync_fixtures transports. notify_changes=False skips the schedule change emails, for
+            syncs against fixtures. leader is the LeaderElection deciding whether this process
+            runs the scheduled jobs.
+        '''
         self.db = None
         self.new_games_map = {}
+        self.new_games_lock = threading.Lock()
+        self.notify_changes = notify_changes
+        self.leader = leader if leader else LeaderElection()
+
+        # team links of each season page, reused while the season page is unchanged
+        self.season_team_links = {}
+
+        self.sync_status = {}
+        self.locker_room_status = {}
+        self.reset_job_status()
+        self.metrics_history = SyncMetricsHistory(self.METRICS_HISTORY_RUNS)
+        self.outbox = OutboxWorker()
+
+        # client shared by all fetches, with the keep-alive connection pool, timeouts, retries and
+        # circuit breakers for the site
+        self.http = HttpClient(session=transport, max_connections=self.FETCH_MAX_CONNECTIONS)
 
         executors = {
             'default': {'type': 'threadpool', 'max_workers': 1},
+            'leader': {'type': 'threadpool', 'max_workers': 1},
+            'leagues': {'type': 'threadpool', 'max_workers': self.SYNCHRONIZE_MAX_CONCURRENT_LEAGUES},
+            'outbox': {'type': 'threadpool', 'max_workers': 1},
             'processpool': ProcessPoolExecutor(max_workers=1)
         }
         job_defaults = {
@@ -43,24 +153,196 @@ class Synchronizer:
         }
         self.scheduler = BackgroundScheduler()
         self.scheduler.configure(executors=executors, job_defaults=job_defaults)
-        self.scheduler.add_job(self.sync, 'interval', hours=self.SYNCHRONIZE_INTERVAL_HOURS)
-        self.scheduler.add_job(self.notify, 'interval', hours=self.NOTIFY_CHECK_INTERVAL_HOURS)
-        self.scheduler.add_job(self.locker_room_assignment_check, 'interval', seconds=self.LOCKER_ROOM_INTERVAL_SECONDS)
+        self.scheduler.add_job(self.leader_check, 'interval', seconds=self.LEADER_CHECK_INTERVAL_SECONDS,
+                               id=self.LEADER_JOB_ID, executor='leader',
+                               next_run_time=datetime.datetime.now(datetime.timezone.utc))
 
         if os.getenv('HOCKEY_REPLY_ENV') == 'prod':
             self.scheduler.start()
 
+    def reset_job_status(self):
+        for league_id in self.SHARKS_ICE_LEAGUES:
+            self.sync_status[league_id] = {
+                'interval_seconds': self.SYNCHRONIZE_INTERVAL_HOURS * 60 * 60,
+                'reason': 'startup',
+                'game_id': None,
+                'last_synced_at': None,
+                'last_result': None
+            }
+        self.locker_room_status.update({
+            'interval_seconds': self.LOCKER_ROOM_INTERVAL_SECONDS,
+            'reason': 'startup',
+            'game_id': None,
+            'last_checked_at': None,
+            'last_updated_games': 0,
+            'missing_games': 0
+        })
+
+    def leader_check(self):
+        ''' Adds the scheduled jobs when this process becomes the leader, and removes them when
+            it stops being the leader
+        '''
+        was_leader = self.scheduler.get_job(self.NOTIFY_JOB_ID) is not None
+        is_leader = self.leader.check()
+
+        if is_leader and not was_leader:
+            write_log('INFO', f'Process {os.getpid()} is the scheduler leader, starting jobs')
+            self.add_scheduled_jobs()
+
+        elif was_leader and not is_leader:
+            write_log('INFO', f'Process {os.getpid()} lost scheduler leadership, stopping jobs')
+            self.remove_scheduled_jobs()
+
+    def add_scheduled_jobs(self):
+        self.reset_job_status()
+
+        for league_id in self.SHARKS_ICE_LEAGUES:
+            self.scheduler.add_job(self.sync_league, 'interval', hours=self.SYNCHRONIZE_INTERVAL_HOURS,
+                                   args=[league_id], id=self.SYNCHRONIZE_JOB_ID.format(league_id=league_id),
+                                   executor='leagues', replace_existing=True)
+        self.scheduler.add_job(self.notify, 'interval', hours=self.NOTIFY_CHECK_INTERVAL_HOURS,
+                               id=self.NOTIFY_JOB_ID, replace_existing=True)
+        self.scheduler.add_job(self.locker_room_assignment_check, 'interval', seconds=self.LOCKER_ROOM_INTERVAL_SECONDS,
+                               id=self.LOCKER_ROOM_JOB_ID, replace_existing=True)
+        self.scheduler.add_job(self.outbox.drain, 'interval', seconds=self.OUTBOX_INTERVAL_SECONDS,
+                               id=self.OUTBOX_JOB_ID, executor='outbox', replace_existing=True)
+
+    def remove_scheduled_jobs(self):
+        for job in self.scheduler.get_jobs():
+            if job.id != self.LEADER_JOB_ID:
+                job.remove()
+
     def locker_room_assignment_check(self):
         self.db = Database()
 
         try:
-            locker_room_source, locker_room_soup = self.open_page(f'{self.SHARKS_ICE_BASE_URL}{self.SHARKS_ICE_LOCKROOM_ENDPOINT}')
-            locker_room_parser = LockerRoomPageParser(locker_room_source, locker_room_soup)
-            locker_room_parser.parse()
-
-            self.db.update_locker_rooms(locker_room_parser)
+            url = self.locker_room_url()
+            page = self.fetch_page(url, self.page_validators(self.db, [url]).get(url),
+                                   breaker=self.LOCKER_ROOM_BREAKER)
+            self.locker_room_status['last_checked_at'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+            if page.status == FetchedPage.CHANGED:
+                locker_room_parser = LockerRoomPageParser(url, make_soup(page.content))
+                locker_room_parser.parse()
+
+                # the page lists the games of the whole rink, so games of leagues that are not
+                # synced are always missing. A synced league's games that are missing because
+                # its sync has not added them yet are applied once it has, see apply_synced_games
+                updated, missing_game_ids = self.db.update_locker_rooms(locker_room_parser)
+                self.locker_room_status['last_updated_games'] = updated
+                self.locker_room_status['missing_games'] = len(missing_game_ids)
+
+                self.db.set_page_fetch_states([page.fetch_state()])
         except:
             pass
+        finally:
+            self.schedule_locker_room_check()
+
+            # hand the connection back to the shared pool between runs
+            self.db.close()
+
+    def locker_room_url(self):
+        return f'{self.SHARKS_ICE_BASE_URL}{self.SHARKS_ICE_LOCKROOM_ENDPOINT}'
+
+    def locker_room_interval(self):
+        ''' Returns (interval_seconds, reason, game_id) for the next locker room check, based on
+            the next game that is still missing its locker rooms
+        '''
+        game = self.db.get_next_game_without_locker_rooms()
+
+        if game is None:
+            return self.LOCKER_ROOM_IDLE_INTERVAL_SECONDS, 'no upcoming games are missing locker rooms', None
+
+        scheduled_at = game.scheduled_at
+        if scheduled_at.tzinfo is None:
+            scheduled_at = scheduled_at.replace(tzinfo=datetime.timezone.utc)
+
+        window_opens_at = scheduled_at - datetime.timedelta(hours=self.LOCKER_ROOM_WINDOW_HOURS)
+        seconds_to_window = (window_opens_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+        if seconds_to_window <= 0:
+            return self.LOCKER_ROOM_INTERVAL_SECONDS, f'game {game.game_id} at {scheduled_at.isoformat()} is missing locker rooms', game.game_id
+
+        interval = min(max(int(seconds_to_window), self.LOCKER_ROOM_INTERVAL_SECONDS), self.LOCKER_ROOM_IDLE_INTERVAL_SECONDS)
+        return interval, f'waiting for the polling window of game {game.game_id} at {scheduled_at.isoformat()}', game.game_id
+
+    def schedule_locker_room_check(self):
+        ''' Moves the locker room job to the interval for the current state of upcoming games '''
+        try:
+            interval, reason, game_id = self.locker_room_interval()
+        except Exception as e:
+            write_log('ERROR', f'Failed to schedule locker room check: {e}')
+            return
+
+        if interval != self.locker_room_status['interval_seconds']:
+            write_log('INFO', f'Locker room check every {interval}s: {reason}')
+            if self.scheduler.get_job(self.LOCKER_ROOM_JOB_ID):
+                self.scheduler.reschedule_job(self.LOCKER_ROOM_JOB_ID, trigger='interval', seconds=interval)
+
+        self.locker_room_status['interval_seconds'] = interval
+        self.locker_room_status['reason'] = reason
+        self.locker_room_status['game_id'] = game_id
+
+    def sync_interval(self, db, league_id):
+        ''' Returns (interval_seconds, reason, game_id) for the next sync of a league, based on its
+            upcoming games in the db
+        '''
+        placeholder_game = db.get_next_game_with_placeholder_team(league_id)
+
+        if placeholder_game is not None:
+            return (self.SYNCHRONIZE_PLACEHOLDER_INTERVAL_MINUTES * 60,
+                    f'game {placeholder_game.game_id} has a placeholder team', placeholder_game.game_id)
+
+        game = db.get_next_game(league_id)
+
+        if game is None:
+            return self.SYNCHRONIZE_OFF_SEASON_INTERVAL_HOURS * 60 * 60, 'no upcoming games', None
+
+        scheduled_at = game.scheduled_at
+        if scheduled_at.tzinfo is None:
+            scheduled_at = scheduled_at.replace(tzinfo=datetime.timezone.utc)
+
+        if scheduled_at - datetime.datetime.now(datetime.timezone.utc) <= datetime.timedelta(hours=self.SYNCHRONIZE_GAMES_SOON_WINDOW_HOURS):
+            return (self.SYNCHRONIZE_GAMES_SOON_INTERVAL_HOURS * 60 * 60,
+                    f'game {game.game_id} at {scheduled_at.isoformat()} is within {self.SYNCHRONIZE_GAMES_SOON_WINDOW_HOURS} hours', game.game_id)
+
+        return (self.SYNCHRONIZE_INTERVAL_HOURS * 60 * 60,
+                f'next game {game.game_id} is at {scheduled_at.isoformat()}', game.game_id)
+
+    def schedule_sync(self, run, success):
+        ''' Moves the league's sync job to the interval for the current state of its upcoming
+            games. Failed syncs are retried after at most SYNCHRONIZE_FAILED_RETRY_MINUTES.
+        '''
+        status = self.sync_status[run.league_id]
+
+        try:
+            interval, reason, game_id = self.sync_interval(run.db, run.league_id)
+        except Exception as e:
+            write_log('ERROR', f'Failed to schedule synchronization of league {run.league_id}: {e}')
+            interval, reason, game_id = self.SYNCHRONIZE_INTERVAL_HOURS * 60 * 60, 'scheduling failed', None
+
+        if not success and interval > self.SYNCHRONIZE_FAILED_RETRY_MINUTES * 60:
+            interval, reason = self.SYNCHRONIZE_FAILED_RETRY_MINUTES * 60, f'retrying failed sync ({reason})'
+
+        write_log('INFO', f'Next synchronization of league {run.league_id} in {interval}s: {reason}')
+        if interval != status['interval_seconds']:
+            job_id = self.SYNCHRONIZE_JOB_ID.format(league_id=run.league_id)
+            if self.scheduler.get_job(job_id):
+                self.scheduler.reschedule_job(job_id, trigger='interval', seconds=interval)
+
+        status['interval_seconds'] = interval
+        status['reason'] = reason
+        status['game_id'] = game_id
+
+    def status(self):
+        ''' Current polling cadence of the synchronizer jobs, for the admin status endpoint '''
+        return {
+            'leader': self.leader.status(),
+            'sync': {league_id: dict(status) for league_id, status in self.sync_status.items()},
+            'locker_rooms': dict(self.locker_room_status),
+            'http': self.http.stats(),
+            'outbox': self.outbox.status()
+        }
 
     def notify(self):
         ''' notify runs periodically to the check the datetime of upcoming games
@@ -68,15 +350,18 @@ class Synchronizer:
         write_log('INFO', f'Notify sync')
         self.db = Database()
 
-        for team_id in self.new_games_map.keys():
-            write_log('INFO', f'Games added {self.new_games_map[team_id]}')
-        self.new_games_map = {}
+        with self.new_games_lock:
+            for team_id in self.new_games_map.keys():
+                write_log('INFO', f'Games added {self.new_games_map[team_id]}')
+            self.new_games_map = {}
 
         coming_soon = self.db.get_games_coming_soon()
 
         for game in coming_soon:
             write_log('INFO', f'Notify coming soon {game.game_id} ({game.scheduled_at})')
-            send_game_coming_soon(self.db, game)
+
+        # the games' emails are sent concurrently, each game is flagged as soon as its are out
+        for game in send_games_coming_soon(self.db, coming_soon):
             game.did_notify_coming_soon = True
 
             # paranoid extra save updates to game was-notification-sent
@@ -85,97 +370,336 @@ class Synchronizer:
 
         # save updates to game was-notification-sent
         self.db.commit_changes()
+        self.db.close()
 
-    def check_deleted_games(self):
-        all_games = self.db.get_games()
+        self.outbox.purge()
 
-        for game in all_games:
-            if game.completed:
-                continue
+    def check_deleted_games(self, run):
+        ''' Flags the league's upcoming games that were not seen in this run. Only games of the
+            teams whose pages were parsed are considered, the others were skipped as unchanged.
+        '''
+        with run.metrics.stage('deleted_games'):
+            deleted = run.db.mark_deleted_games(run.league_id, run.synced_games.keys(), run.synced_team_ids)
 
-            if game.id not in self.synced_games_list:
-                write_log('INFO', f'Game DELETED game_id {game.id}')
-                # TODO
-                # self.db.remove_game_by_id(game.id)
-                # notify teams
+            deleted_by_team = {}
+            for game in deleted:
+                write_log('INFO', f'Game DELETED game_id {game.game_id}')
+                for team_id in [game.home_team_id, game.away_team_id]:
+                    deleted_by_team[team_id] = deleted_by_team.get(team_id, 0) + 1
 
-    def sync(self):
-        write_log('INFO', f'Synchronization started')
-        self.db = Database()
-        self.new_games_map = {}
-        self.synced_games_list = []
+            suspect_team_ids = [team_id for team_id, count in deleted_by_team.items()
+                                if count > self.CANCELLED_GAMES_NOTIFY_LIMIT]
 
-        any_sync_failures = False
+            if suspect_team_ids:
+                write_log('ERROR', f'League {run.league_id} sync deleted {len(deleted)} games, more than '
+                                   f'{self.CANCELLED_GAMES_NOTIFY_LIMIT} of teams {suspect_team_ids}. '
+                                   f'Not sending the cancelled games emails')
+            elif deleted and self.notify_changes:
+                send_games_cancelled(run.db, deleted)
 
-        for season in self.SHARKS_ICE_SEASON_ENDPOINTS:
-            url = f'{self.SHARKS_ICE_BASE_URL}{season}'
-            if not self.sync_season(url):
-                any_sync_failures = True
+        run.metrics.games['deleted'] = len(deleted)
 
-        if not any_sync_failures:
-            self.check_deleted_games()
+    def sync(self):
+        ''' Syncs every league now, one after the other. The scheduled jobs sync each league on
+            its own with sync_league.
+        '''
+        for league_id in self.SHARKS_ICE_LEAGUES:
+            self.sync_league(league_id)
 
-        write_log('INFO', f'Synchronization complete')
         return True
 
-    def sync_season(self, url):
+    def sync_league(self, league_id):
+        ''' Syncs the games of one league and commits them. Failures are contained to the league,
+            the other leagues' jobs carry on.
+        '''
+        write_log('INFO', f'Synchronization of league {league_id} started')
+        run = LeagueSync(league_id)
+        success = False
 
-        source, soup = self.open_season_page(url)
-        for link in soup.find_all('a'):
-            
-            href = link.get('href')
-            if href.find(self.SHARKS_ICE_TEAM_ENDPOINT) == -1:
-                print_log(f'SKIPPING {link}, not a team page')
-                continue
+        try:
+            url = f'{self.SHARKS_ICE_BASE_URL}{self.SHARKS_ICE_SEASON_ENDPOINT.format(league_id=league_id)}'
+            success = self.sync_season(run, url)
+
+            self.apply_synced_games(run)
+
+            if success:
+                self.check_deleted_games(run)
+
+        except Exception as e:
+            write_log('ERROR', f'Failed synchronization of league {league_id}: {e}')
+            run.db.session.rollback()
+
+        finally:
+            status = self.sync_status.setdefault(league_id, {'interval_seconds': None})
+            status['last_synced_at'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            status['last_result'] = 'success' if success else 'failed'
+
+            self.schedule_sync(run, success)
+            run.db.close()
+
+            run.metrics.finish(success, run.page_counts, run.game_counts)
+            self.metrics_history.add(run.metrics)
+
+        write_log('INFO', f'Synchronization of league {league_id} complete in {run.metrics.seconds:.1f}s: '
+                          f'{run.page_counts[FetchedPage.CHANGED]} pages fetched, '
+                          f'{run.page_counts[FetchedPage.NOT_MODIFIED]} not modified, '
+                          f'{run.page_counts[FetchedPage.UNCHANGED]} skipped as unchanged, '
+                          f'{run.game_counts["parsed"]} games parsed, '
+                          f'{run.game_counts["duplicates"]} duplicates folded '
+                          f'({run.game_counts["conflicts"]} conflicting)')
+        return success
+
+    def sync_season(self, run, url):
+        ''' Fetches and parses the team pages of a season and merges their games into the run's
+            synced_games. Nothing from the season is merged if any of its pages fail.
+        '''
+        season_games = []
+        season_stats = []
+        season_pages = []
+
+        # stage 1: find the team pages linked from the season page. The links from the last run
+        # are reused if the season page has not changed since.
+        with run.metrics.stage('season_page'):
+            validators = self.page_validators(run.db, [url]) if url in self.season_team_links else {}
+            season_page = self.fetch_page(url, validators.get(url), run.metrics, breaker=run.league_id)
+            run.page_counts[season_page.status] += 1
+
+            if season_page.status == FetchedPage.CHANGED:
+                soup = make_soup(season_page.content, 'a')
+
+                team_links = []
+                for link in soup.find_all('a'):
+
+                    href = link.get('href')
+                    if href.find(self.SHARKS_ICE_TEAM_ENDPOINT) == -1:
+                        print_log(f'SKIPPING {link}, not a team page')
+                        continue
+
+                    team_links.append((link.string.strip(), href))
+
+                self.season_team_links[url] = team_links
+                season_pages.append(season_page)
+
+        team_links = self.season_team_links[url]
+
+        # stage 2: download all of the team pages concurrently, conditional on the version
+        # that was applied last
+        team_urls = [f'{self.SHARKS_ICE_BASE_URL}{href}' for _, href in team_links]
+        with run.metrics.stage('fetch_team_pages'):
+            team_pages = self.fetch_pages(team_urls, self.page_validators(run.db, team_urls), run.metrics,
+                                          breaker=run.league_id)
+
+        # stage 3: parse the changed pages
+        seen_urls = set()
+        season_team_ids = set()
+        for team_name, href in team_links:
+
+            team_url = f'{self.SHARKS_ICE_BASE_URL}{href}'
+            team_page = team_pages[team_url]
+
+            if team_url in seen_urls:
+                continue # team linked more than once
+            seen_urls.add(team_url)
+
+            if isinstance(team_page, Exception):
+                write_log('ERROR', f'Failed synchronization of website at {url}, could not fetch {team_url}: {team_page}')
+                return False
 
-            team_name = link.string.strip()
+            run.page_counts[team_page.status] += 1
+            if team_page.status != FetchedPage.CHANGED:
+                continue
 
-            print_log(f'Parsing {team_name} at {link}')
-            team_source, team_soup = self.open_team_page(href)
-            team_parser = TeamPageParser(team_source, team_soup)
-            success = team_parser.parse()
+            print_log(f'Parsing {team_name} at {href}')
+            with run.metrics.stage('parse'):
+                parse_start = time.perf_counter()
+                team_parser = TeamPageParser(team_url, make_soup(team_page.content))
+                success = team_parser.parse()
+                run.metrics.record_parse(team_url, time.perf_counter() - parse_start)
 
             if not success:
                 write_log('ERROR', f'Failed synchronization of website at {url}')
                 return False
 
-            self.db.add_team(team_name, team_parser.external_id)
+            team = run.db.add_team(team_name, team_parser.external_id)
 
-            for game in team_parser.games:
-                game_is_new = self.db.add_game(game)
-                db_game = self.db.get_game_by_id(game.id)
+            # a page without games is taken as a glitch on the site, not as every game of the
+            # team being cancelled
+            if team_parser.games:
+                season_team_ids.add(team.team_id)
+            else:
+                write_log('WARNING', f'No games on the page of {team_name} at {team_url}, its games are not checked for deletions')
 
-                self.synced_games_list.append(game.id)
+            season_games.extend((team_name, game) for game in team_parser.games)
+            season_pages.append(team_page)
 
-                if game_is_new:
-                    if not db_game.home_team_id in self.new_games_map:
-                        self.new_games_map[db_game.home_team_id] = []
-                    if not db_game.away_team_id in self.new_games_map:
-                        self.new_games_map[db_game.away_team_id] = []
+            if team_parser.season_num is not None:
+                season_stats.append((team.team_id, team_parser.season_num,
+                                     team_parser.player_stats_rows(), team_parser.goalie_stats_rows()))
 
-                    self.new_games_map[db_game.home_team_id].append(db_game.game_id)
-                    self.new_games_map[db_game.away_team_id].append(db_game.game_id)
+        for team_name, game in season_games:
+            self.merge_synced_game(run, game, team_name)
+
+        run.synced_team_ids.update(season_team_ids)
+        run.synced_stats.extend(season_stats)
+        run.applied_pages.extend(season_pages)
+        return True
+
+    def merge_synced_game(self, run, game, team_name):
+        ''' Every game is listed on the schedule pages of both of its teams. The copies are merged
+            into synced_games so each game is applied once per run. When the copies differ, the
+            completed copy wins, then the copy from the home team's page. Otherwise the first copy
+            parsed is kept.
+        '''
+        run.game_counts['parsed'] += 1
+        rank = (game.completed, team_name.lower() == game.home_team.lower())
+
+        if game.id not in run.synced_games:
+            run.synced_games[game.id] = (rank, game)
+            return
+
+        run.game_counts['duplicates'] += 1
+        kept_rank, kept = run.synced_games[game.id]
+
+        if self.game_details(game) != self.game_details(kept):
+            run.game_counts['conflicts'] += 1
+            write_log('INFO', f'Conflicting copies of game {game.id} from {team_name} and an earlier page')
+
+        if rank > kept_rank:
+            run.synced_games[game.id] = (rank, game)
+
+    def game_details(self, game):
+        return (game.completed, game.datetime, game.rink, game.home_team.lower(), game.away_team.lower(),
+                game.home_goals, game.away_goals)
+
+    def apply_synced_games(self, run):
+        ''' Applies the league's games in one transaction and the stats of the parsed team pages in
+            another, then sends the notifications and records the versions of the pages that were
+            applied
+        '''
+        with run.metrics.stage('apply_games'):
+            new_games, schedule_changes, updated_count = run.db.add_games(
+                [game for _, game in run.synced_games.values()], run.league_id)
+
+        run.metrics.games.update({'inserted': len(new_games), 'updated': updated_count,
+                                  'rescheduled': len(schedule_changes)})
+
+        # locker rooms can be posted before the sync adds a game, the locker room page skipped
+        # them. Forgetting the version of the page that was applied has it applied again on the
+        # next locker room check, even though it has not changed.
+        new_game_ids = {new_game['game_id'] for new_game in new_games}
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if any(game_id in new_game_ids and game.datetime > now for game_id, (_, game) in run.synced_games.items()):
+            run.db.set_page_fetch_states([(self.locker_room_url(), None, None, None)])
+
+        if run.synced_stats:
+            with run.metrics.stage('apply_stats'):
+                run.db.set_team_stats(run.league_id, run.synced_stats)
+
+        with self.new_games_lock:
+            for new_game in new_games:
+                for team_id in [new_game['home_team_id'], new_game['away_team_id']]:
+                    if not team_id in self.new_games_map:
+                        self.new_games_map[team_id] = []
+
+                    self.new_games_map[team_id].append(new_game['game_id'])
+
+        if self.notify_changes:
+            with run.metrics.stage('notify'):
+                for game, old_scheduled_at in schedule_changes:
+                    send_game_time_changed(run.db, game, old_scheduled_at)
+
+        # the pages are applied, remember their versions to skip them while they are unchanged
+        if run.applied_pages:
+            with run.metrics.stage('page_states'):
+                run.db.set_page_fetch_states([page.fetch_state() for page in run.applied_pages])
+
+    def fetch(self, url):
+        ''' Downloads url with the shared client. Raises on timeouts, connection errors and error
+            statuses once the retries are used up, and while the circuit breaker is open.
+        '''
+        req = self.http.get(url)
+        req.raise_for_status()
+        return req.content
+
+    def page_validators(self, db, urls):
+        ''' Returns url -> (etag, last_modified, content_hash) of the last applied version of each
+            page. Plain tuples, so the fetch threads do not touch the db session.
+        '''
+        return {url: (state.etag, state.last_modified, state.content_hash)
+                for url, state in db.get_page_fetch_states(urls).items()}
+
+    def fetch_page(self, url, validators, metrics=None, breaker=DEFAULT_BREAKER):
+        ''' Conditional download of url. validators is (etag, last_modified, content_hash) of the
+            version last applied, or None to always treat the page as changed. Returns a
+            FetchedPage. The latency, status and size of the download are recorded in metrics.
+            breaker names the job's circuit breaker in the http client.
+        '''
+        headers = {}
+        etag, last_modified, content_hash = validators if validators else (None, None, None)
+
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        start = time.perf_counter()
+        status, size = 'error', 0
+
+        try:
+            req = self.http.get(url, headers=headers, breaker=breaker)
+            size = len(req.content)
+
+            if req.status_code == 304:
+                status = FetchedPage.NOT_MODIFIED
+                return FetchedPage(url, status, etag=etag, last_modified=last_modified, content_hash=content_hash)
+
+            req.raise_for_status()
+
+            new_content_hash = hashlib.sha256(req.content).hexdigest()
+            status = FetchedPage.UNCHANGED if new_content_hash == content_hash else FetchedPage.CHANGED
+
+            return FetchedPage(url, status, req.content,
+                               req.headers.get('ETag'), req.headers.get('Last-Modified'), new_content_hash)
+        finally:
+            if metrics is not None:
+                metrics.record_fetch(url, status, time.perf_counter() - start, size)
+
+    def fetch_pages(self, urls, validators, metrics=None, breaker=DEFAULT_BREAKER):
+        ''' Conditionally downloads all of the urls concurrently. Returns a dict of
+            url -> FetchedPage, or url -> exception for pages that could not be fetched.
+        '''
+        pages = {}
+        urls = list(dict.fromkeys(urls))
+
+        def fetch_or_error(url):
+            try:
+                return self.fetch_page(url, validators.get(url), metrics, breaker)
+            except Exception as e:
+                return e
+
+        with FetchPoolExecutor(max_workers=self.FETCH_MAX_CONNECTIONS) as executor:
+            for url, page in zip(urls, executor.map(fetch_or_error, urls)):
+                pages[url] = page
+
+        return pages
 
     def open_season_page(self, url):
-        req = requests.get(url)
-        data = req.content
-        soup = BeautifulSoup(data, 'html.parser')
+        data = self.fetch(url)
+        soup = make_soup(data, only_tag=None)
 
         return url, soup
 
 
     def open_team_page(self, team_endpoint):
         url = f'{self.SHARKS_ICE_BASE_URL}{team_endpoint}'
-        req = requests.get(url)
-        data = req.content
-        soup = BeautifulSoup(data, 'html.parser')
+        data = self.fetch(url)
+        soup = make_soup(data)
 
         return url, soup
 
     def open_page(self, url):
-        req = requests.get(url)
-        data = req.content
-        soup = BeautifulSoup(data, 'html.parser')
+        data = self.fetch(url)
+        soup = make_soup(data, only_tag=None)
 
         return url, soup
 
@@ -193,13 +717,15 @@ class Synchronizer:
             print_log(f'Failed synchronization of website')
             return
 
-        for game in team_parser.games:
-            self.db.add_game(game)
+        new_games, schedule_changes, _ = self.db.add_games(team_parser.games)
+
+        for game, old_scheduled_at in schedule_changes:
+            send_game_time_changed(self.db, game, old_scheduled_at)
 
         print_log(f'Synchronization complete')
 
     def open_test_file(self, path):
-        f = open(path)
-        soup = BeautifulSoup(f, 'html.parser')
+        with open(path) as f:
+            soup = make_soup(f)
 
         return path, soup
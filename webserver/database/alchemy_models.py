@@ -6,7 +6,7 @@ returned by all hockey_db.Database queries and changes to these objects are prop
 to the actual DB.
 '''
 import secrets
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, DateTime, Boolean, Float, Index, JSON, func
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import UniqueConstraint
@@ -23,6 +23,7 @@ class TeamPlayer(Base):
     number = Column(String)
     pending_status = Column(Boolean)
     joined_at = Column(DateTime)
+    updated_at = Column(DateTime)   # last role or join request change
     player = relationship("User", back_populates="teams") # TODO rename user
     team = relationship("Team", back_populates="players")
 
@@ -62,6 +63,11 @@ class Game(Base):
     created_at = Column(DateTime)
     home_locker_room = Column(String)
     away_locker_room = Column(String)
+    league_id = Column(Integer)
+    is_deleted = Column(Boolean, default=False, nullable=False)
+    deleted_at = Column(DateTime)
+    shootout = Column(Boolean, default=False, nullable=False)
+    season = Column(Integer)
 
 class GameReply(Base):
     __tablename__ = "game_reply"
@@ -74,6 +80,122 @@ class GameReply(Base):
     message = Column(String)
     modified_at = Column(DateTime)
 
+class GameReplySummary(Base):
+    ''' Reply counts per (game, team), kept up to date by Database.set_game_reply so lists and
+        notifications do not have to scan all of the replies. Goalies are excluded from
+        count_yes and counted in count_goalie instead.
+    '''
+    __tablename__ = "game_reply_summary"
+    game_id = Column(Integer, ForeignKey("game.game_id"), primary_key=True)
+    team_id = Column(Integer, primary_key=True)
+    count_yes = Column(Integer, default=0, nullable=False)
+    count_no = Column(Integer, default=0, nullable=False)
+    count_maybe = Column(Integer, default=0, nullable=False)
+    count_goalie = Column(Integer, default=0, nullable=False)
+
+class PageFetchState(Base):
+    ''' Validators (ETag/Last-Modified) and content hash of the last version of a Sharks Ice page
+        that the synchronizer applied to the db
+    '''
+    __tablename__ = "page_fetch_state"
+    url = Column(String, primary_key=True)
+    etag = Column(String)
+    last_modified = Column(String)
+    content_hash = Column(String)
+    changed_at = Column(DateTime)
+
+class PlayerStats(Base):
+    ''' Season stats of a player on a team, from the Player Stats table of the team's Sharks Ice
+        page. Players are identified by name, the site has no player ids.
+    '''
+    __tablename__ = "player_stats"
+    team_id = Column(Integer, ForeignKey("team.team_id"), primary_key=True)
+    season = Column(Integer, primary_key=True)
+    name = Column(String, primary_key=True)
+    league_id = Column(Integer)
+    number = Column(String)
+    games_played = Column(Integer)
+    goals = Column(Integer)
+    assists = Column(Integer)
+    points = Column(Integer)
+    power_play_goals = Column(Integer)
+    power_play_assists = Column(Integer)
+    short_handed_goals = Column(Integer)
+    short_handed_assists = Column(Integer)
+    game_winning_goals = Column(Integer)
+    game_winning_assists = Column(Integer)
+    penalty_shot_goals = Column(Integer)
+    empty_net_goals = Column(Integer)
+    shootout_goals = Column(Integer)
+    hat_tricks = Column(Integer)
+    updated_at = Column(DateTime)
+
+class GoalieStats(Base):
+    ''' Season stats of a goalie on a team, from the Goalie Stats table of the team's Sharks Ice
+        page
+    '''
+    __tablename__ = "goalie_stats"
+    team_id = Column(Integer, ForeignKey("team.team_id"), primary_key=True)
+    season = Column(Integer, primary_key=True)
+    name = Column(String, primary_key=True)
+    league_id = Column(Integer)
+    number = Column(String)
+    games_played = Column(Integer)
+    shots = Column(Integer)
+    goals_against = Column(Integer)
+    goals_against_average = Column(Float)
+    save_percentage = Column(Float)
+    shutouts = Column(Integer)
+    wins = Column(Integer)
+    losses = Column(Integer)
+    overtime_losses = Column(Integer)
+    ties = Column(Integer)
+    goals = Column(Integer)
+    assists = Column(Integer)
+    points = Column(Integer)
+    updated_at = Column(DateTime)
+
+class Standing(Base):
+    ''' A team's record in its level for a season, from the completed regular season games. Kept
+        up to date by Database.add_games as games complete, see Database.update_standings.
+    '''
+    __tablename__ = "standings"
+    league_id = Column(Integer, primary_key=True)
+    season = Column(Integer, primary_key=True)
+    level = Column(String, primary_key=True)
+    team_id = Column(Integer, ForeignKey("team.team_id"), primary_key=True)
+    games_played = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    losses = Column(Integer, default=0, nullable=False)
+    ties = Column(Integer, default=0, nullable=False)
+    shootout_wins = Column(Integer, default=0, nullable=False)
+    shootout_losses = Column(Integer, default=0, nullable=False)
+    points = Column(Integer, default=0, nullable=False)
+    goals_for = Column(Integer, default=0, nullable=False)
+    goals_against = Column(Integer, default=0, nullable=False)
+    streak_result = Column(String)     # W, L or T
+    streak_length = Column(Integer)
+    last_game_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+class EmailOutbox(Base):
+    ''' An email queued by an API handler in the transaction of the change it is about. Sent by
+        the leader's outbox job, see email_outbox.OutboxWorker.
+    '''
+    __tablename__ = "email_outbox"
+    outbox_id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String, nullable=False, unique=True)
+    template = Column(String, nullable=False)       # EmailTemplate name
+    data = Column(JSON, nullable=False)
+    to_emails = Column(JSON, nullable=False)
+    recipients = Column(String)     # to_emails as one string, see hockey_db.outbox_recipients
+    status = Column(String, default='pending', nullable=False)     # pending, sending, sent or failed
+    attempts = Column(Integer, default=0, nullable=False)
+    claim_token = Column(String)
+    next_attempt_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime)
+    sent_at = Column(DateTime)
+
 class User(Base):
     __tablename__ = "users"
     __table_args__ = (UniqueConstraint("google_id"), UniqueConstraint("email"))
@@ -145,3 +267,32 @@ class GameChatReaction(Base):
 
     # Relationships
     message = relationship("GameChatMessage", back_populates="reactions")
+
+# Indexes for the hot lookups in hockey_db.Database. The schema is owned by the migrations in
+# database/migrations (0003_query_indexes.sql, 0005_game_league.sql, 0007_team_stats.sql,
+# 0009_email_outbox.sql, 0010_team_name_unique.sql), these declarations mirror them so the models
+# describe the full schema.
+Index('ix_game_reply_game_team', GameReply.game_id, GameReply.team_id)
+Index('ix_game_home_team_scheduled_at', Game.home_team_id, Game.scheduled_at)
+Index('ix_game_away_team_scheduled_at', Game.away_team_id, Game.scheduled_at)
+Index('ix_game_scheduled_at', Game.scheduled_at)
+Index('ix_team_player_user_id', TeamPlayer.user_id)
+Index('ix_team_player_team_id', TeamPlayer.team_id)
+Index('ix_team_goalie_team_id', TeamGoalie.team_id)
+Index('ix_users_lower_email', func.lower(User.email))
+Index('ix_users_lower_external_id', func.lower(User.external_id))
+Index('ix_users_password_reset_token', User.password_reset_token,
+      postgresql_where=User.password_reset_token != None,
+      sqlite_where=User.password_reset_token != None)
+Index('ix_team_lower_name_unique', func.lower(Team.name), unique=True)
+Index('ix_game_league_scheduled_at', Game.league_id, Game.scheduled_at)
+# the migration orders these NULLS LAST, like the leader queries. sqlite can not index NULLS LAST.
+Index('ix_player_stats_league_season_points', PlayerStats.league_id, PlayerStats.season, PlayerStats.points.desc())
+Index('ix_goalie_stats_league_season_save_percentage', GoalieStats.league_id, GoalieStats.season,
+      GoalieStats.save_percentage.desc())
+Index('ix_email_outbox_due', EmailOutbox.next_attempt_at,
+      postgresql_where=EmailOutbox.status.in_(['pending', 'sending']),
+      sqlite_where=EmailOutbox.status.in_(['pending', 'sending']))
+Index('ix_email_outbox_recipients', EmailOutbox.recipients, EmailOutbox.outbox_id,
+      postgresql_where=EmailOutbox.status.in_(['pending', 'sending']),
+      sqlite_where=EmailOutbox.status.in_(['pending', 'sending']))
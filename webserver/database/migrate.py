@@ -0,0 +1,105 @@
+'''
+migrate
+
+Versioned schema migrations. Each file in database/migrations is named <version>_<description>.sql
+and is applied once, in version order, in its own transaction. Applied versions are recorded in
+the schema_migrations table. New schema changes go in a new file with the next version number;
+applied files must not be edited.
+
+To apply pending migrations: python -m webserver.database.migrate
+To list applied and pending migrations: python -m webserver.database.migrate --status
+'''
+import datetime
+import os
+import sys
+
+from sqlalchemy import text
+
+from webserver.database.hockey_db import get_engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+def available_migrations():
+    ''' Returns [(version, path)] for all migration files, sorted by version '''
+    migrations = []
+
+    for filename in os.listdir(MIGRATIONS_DIR):
+        if not filename.endswith('.sql'):
+            continue
+
+        version = filename.split('_')[0]
+        migrations.append((version, os.path.join(MIGRATIONS_DIR, filename)))
+
+    return sorted(migrations)
+
+def split_statements(sql):
+    ''' Splits a migration file into statements. Statements end with a ';' at the end of a line,
+        which keeps the files runnable by drivers that only accept one statement per execute.
+    '''
+    statements = []
+    current = []
+
+    for line in sql.splitlines():
+        if line.strip().startswith('--'):
+            continue
+
+        current.append(line)
+        if line.rstrip().endswith(';'):
+            statements.append('\n'.join(current).strip())
+            current = []
+
+    if '\n'.join(current).strip():
+        statements.append('\n'.join(current).strip())
+
+    return statements
+
+def applied_migrations(connection):
+    connection.execute(text('CREATE TABLE IF NOT EXISTS schema_migrations('
+                            'version TEXT PRIMARY KEY, '
+                            'applied_at TIMESTAMP WITH TIME ZONE)'))
+
+    return {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+def migrate(engine=None):
+    ''' Applies all pending migrations. Returns the list of versions applied. '''
+    engine = engine if engine else get_engine()
+
+    with engine.begin() as connection:
+        applied = applied_migrations(connection)
+
+    newly_applied = []
+    for version, path in available_migrations():
+        if version in applied:
+            continue
+
+        with open(path, 'r') as f:
+            sql = f.read()
+
+        with engine.begin() as connection:
+            for statement in split_statements(sql):
+                connection.exec_driver_sql(statement)
+
+            connection.execute(text('INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)'),
+                               {'version': version, 'applied_at': datetime.datetime.now(datetime.timezone.utc)})
+
+        print(f'Applied migration {os.path.basename(path)}')
+        newly_applied.append(version)
+
+    return newly_applied
+
+def status(engine=None):
+    engine = engine if engine else get_engine()
+
+    with engine.begin() as connection:
+        applied = applied_migrations(connection)
+
+    for version, path in available_migrations():
+        state = 'applied' if version in applied else 'pending'
+        print(f'{state:8} {os.path.basename(path)}')
+
+if __name__ == '__main__':
+    if '--status' in sys.argv:
+        status()
+    else:
+        applied = migrate()
+        print(f'{len(applied)} migration(s) applied')
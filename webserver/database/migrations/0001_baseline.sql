@@ -1,7 +1,42 @@
-PRAGMA foreign_keys=OFF;
-BEGIN;
+-- Baseline schema, previously kept in database/hockey.sql. Tables are created only if missing so
+-- this is a no-op against databases that predate the migrations.
 
-CREATE TABLE game(
+CREATE TABLE IF NOT EXISTS team(
+    team_id         SERIAL     PRIMARY KEY,
+    external_id     INTEGER    DEFAULT 0,
+    name            TEXT       NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS users(
+    user_id         SERIAL     PRIMARY KEY,
+
+    external_id     TEXT,
+
+    google_id       TEXT,
+    activated       INTEGER    DEFAULT 0,
+
+    _password       TEXT,
+    salt            TEXT,
+
+    password_reset_token    TEXT,
+    password_reset_token_expires_at  TIMESTAMP WITH TIME ZONE,
+
+    first_name      TEXT,
+    last_name       TEXT,
+    email           TEXT,
+    phone_number    TEXT,
+    usa_hockey_number TEXT,
+
+    created_at      TIMESTAMP WITH TIME ZONE,
+    logged_in_at    TIMESTAMP WITH TIME ZONE,
+
+    admin           BOOLEAN,
+
+    UNIQUE (google_id),
+    UNIQUE (email)
+);
+
+CREATE TABLE IF NOT EXISTS game(
     game_id         INTEGER     PRIMARY KEY     NOT NULL,
     scheduled_at    TIMESTAMP WITH TIME ZONE    NOT NULL,
     completed       INTEGER     DEFAULT 0,
@@ -18,11 +53,11 @@ CREATE TABLE game(
     did_notify_coming_soon BOOLEAN,
     created_at      TIMESTAMP WITH TIME ZONE,
     home_locker_room TEXT,
-    away_locker_room TEXT,
+    away_locker_room TEXT
 );
 
-CREATE TABLE game_reply(
-    reply_id        SERIAL,
+CREATE TABLE IF NOT EXISTS game_reply(
+    reply_id        SERIAL      PRIMARY KEY,
     game_id         INTEGER,
     team_id         INTEGER,
     user_id         INTEGER,
@@ -32,8 +67,27 @@ CREATE TABLE game_reply(
     modified_at     TIMESTAMP WITH TIME ZONE
 );
 
+CREATE TABLE IF NOT EXISTS team_player(
+    user_id         INTEGER,
+    team_id         INTEGER,
+    role            TEXT,
+    number          TEXT,
+    pending_status  BOOLEAN,
+    joined_at       TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (team_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS team_goalie(
+    id              SERIAL     PRIMARY KEY,
+    user_id         INTEGER,
+    team_id         INTEGER,
+    nickname        TEXT,
+    phone_number    TEXT,
+    "order"         INTEGER
+);
+
 -- Game chat messages
-CREATE TABLE game_chat_message (
+CREATE TABLE IF NOT EXISTS game_chat_message (
     message_id         SERIAL PRIMARY KEY,
     game_id            INTEGER NOT NULL REFERENCES game(game_id),
     team_id            INTEGER NOT NULL REFERENCES team(team_id),
@@ -46,7 +100,7 @@ CREATE TABLE game_chat_message (
 );
 
 -- Message reactions (emoji)
-CREATE TABLE game_chat_reaction (
+CREATE TABLE IF NOT EXISTS game_chat_reaction (
     reaction_id        SERIAL PRIMARY KEY,
     message_id         INTEGER NOT NULL REFERENCES game_chat_message(message_id),
     user_id            INTEGER NOT NULL REFERENCES users(user_id),
@@ -55,65 +109,12 @@ CREATE TABLE game_chat_reaction (
     UNIQUE (message_id, user_id, emoji)
 );
 
--- Create indexes for common queries
-CREATE INDEX idx_game_chat_message_game_team
+CREATE INDEX IF NOT EXISTS idx_game_chat_message_game_team
     ON game_chat_message(game_id, team_id);
 
-CREATE INDEX idx_game_chat_message_parent
+CREATE INDEX IF NOT EXISTS idx_game_chat_message_parent
     ON game_chat_message(parent_message_id)
     WHERE parent_message_id IS NOT NULL;
 
-CREATE INDEX idx_game_chat_reaction_message
+CREATE INDEX IF NOT EXISTS idx_game_chat_reaction_message
     ON game_chat_reaction(message_id);
-
-CREATE TABLE team(
-    team_id         SERIAL     PRIMARY KEY,
-    external_id     INTEGER    DEFAULT 0,
-    name            TEXT       NOT NULL
-);
-
-CREATE TABLE team_player(
-    user_id         INTEGER,
-    team_id         INTEGER,
-    role            TEXT,
-    number          INTEGER,
-    pending_status  BOOLEAN,
-    joined_at       TIMESTAMP WITH TIME ZONE
-);
-
-CREATE TABLE team_goalie(
-    id              SERIAL     PRIMARY KEY,
-    user_id         INTEGER,
-    team_id         INTEGER,
-    nickname        TEXT,
-    phone_number    TEXT,
-    order           INTEGER
-);
-
-CREATE TABLE users(
-    user_id         SERIAL     PRIMARY KEY,
-
-    external_id     TEXT,
-
-    google_id       TEXT,
-    activated       BOOL,
-
-    _password       TEXT,
-    salt            TEXT,
-
-    password_reset_token    TEXT,
-    password_reset_token_expire_at  TIMESTAMP WITH TIME ZONE;
-
-    first_name      TEXT,
-    last_name       TEXT,
-    email           TEXT,
-    phone_number    TEXT,
-    usa_hockey_number TEXT,
-
-    created_at      TIMESTAMP WITH TIME ZONE,
-    logged_in_at    TIMESTAMP WITH TIME ZONE,
-
-    admin           BOOL
-);
-
-COMMIT;
@@ -0,0 +1,25 @@
+-- Reply counts per (game, team), maintained by Database.set_game_reply
+-- Repair with: python -m webserver.database.rebuild_reply_summary
+CREATE TABLE IF NOT EXISTS game_reply_summary(
+    game_id         INTEGER     NOT NULL,
+    team_id         INTEGER     NOT NULL,
+    count_yes       INTEGER     NOT NULL DEFAULT 0,
+    count_no        INTEGER     NOT NULL DEFAULT 0,
+    count_maybe     INTEGER     NOT NULL DEFAULT 0,
+    count_goalie    INTEGER     NOT NULL DEFAULT 0,
+    PRIMARY KEY (game_id, team_id)
+);
+
+-- Backfill from the existing replies, set_game_reply only applies deltas to the rows. Same
+-- tallies as Database.rebuild_game_reply_summary
+INSERT INTO game_reply_summary(game_id, team_id, count_yes, count_no, count_maybe, count_goalie)
+SELECT game_id,
+       team_id,
+       SUM(CASE WHEN response = 'yes' AND NOT COALESCE(is_goalie, FALSE) THEN 1 ELSE 0 END),
+       SUM(CASE WHEN response = 'no' THEN 1 ELSE 0 END),
+       SUM(CASE WHEN response = 'maybe' THEN 1 ELSE 0 END),
+       SUM(CASE WHEN response = 'yes' AND COALESCE(is_goalie, FALSE) THEN 1 ELSE 0 END)
+FROM game_reply
+WHERE team_id IS NOT NULL
+GROUP BY game_id, team_id
+ON CONFLICT (game_id, team_id) DO NOTHING;
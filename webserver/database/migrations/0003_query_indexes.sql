@@ -0,0 +1,45 @@
+-- Indexes for the hot Database lookups. The lower(...) indexes match the func.lower filters in
+-- Database.get_user, get_team and get_user_by_external_id.
+
+-- game_replies_for_game, set_game_reply, game_reply_counts
+CREATE INDEX IF NOT EXISTS ix_game_reply_game_team
+    ON game_reply(game_id, team_id);
+
+-- get_games_for_team, get_games_feed (home OR away, ordered by scheduled_at)
+CREATE INDEX IF NOT EXISTS ix_game_home_team_scheduled_at
+    ON game(home_team_id, scheduled_at);
+
+CREATE INDEX IF NOT EXISTS ix_game_away_team_scheduled_at
+    ON game(away_team_id, scheduled_at);
+
+-- get_games_coming_soon
+CREATE INDEX IF NOT EXISTS ix_game_scheduled_at
+    ON game(scheduled_at);
+
+-- User.teams and Team.players relationships, get_team_player
+CREATE INDEX IF NOT EXISTS ix_team_player_user_id
+    ON team_player(user_id);
+
+CREATE INDEX IF NOT EXISTS ix_team_player_team_id
+    ON team_player(team_id);
+
+-- Team.goalies relationship
+CREATE INDEX IF NOT EXISTS ix_team_goalie_team_id
+    ON team_goalie(team_id);
+
+-- get_user
+CREATE INDEX IF NOT EXISTS ix_users_lower_email
+    ON users(lower(email));
+
+-- get_user_by_external_id
+CREATE INDEX IF NOT EXISTS ix_users_lower_external_id
+    ON users(lower(external_id));
+
+-- get_user_by_password_reset_token
+CREATE INDEX IF NOT EXISTS ix_users_password_reset_token
+    ON users(password_reset_token)
+    WHERE password_reset_token IS NOT NULL;
+
+-- get_team
+CREATE INDEX IF NOT EXISTS ix_team_lower_name
+    ON team(lower(name));
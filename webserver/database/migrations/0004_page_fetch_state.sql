@@ -0,0 +1,9 @@
+-- HTTP validators and content hash of each Sharks Ice page the synchronizer downloads, so
+-- unchanged pages can be skipped on the next sync
+CREATE TABLE IF NOT EXISTS page_fetch_state(
+    url             TEXT        PRIMARY KEY,
+    etag            TEXT,
+    last_modified   TEXT,
+    content_hash    TEXT,
+    changed_at      TIMESTAMP WITH TIME ZONE
+);
@@ -0,0 +1,5 @@
+-- League of each game, so every league can be synced and scheduled on its own. All of the games
+-- synced before this migration are from league 1.
+ALTER TABLE game ADD COLUMN IF NOT EXISTS league_id INTEGER;
+UPDATE game SET league_id = 1 WHERE league_id IS NULL;
+CREATE INDEX IF NOT EXISTS ix_game_league_scheduled_at ON game(league_id, scheduled_at);
@@ -0,0 +1,4 @@
+-- Games that disappear from the league schedule are flagged rather than deleted, so replies and
+-- chats for them are kept. Deleted games are left out of the schedule reads.
+ALTER TABLE game ADD COLUMN IF NOT EXISTS is_deleted BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE game ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE;
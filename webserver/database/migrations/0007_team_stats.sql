@@ -0,0 +1,56 @@
+-- Player and goalie season stats from the team pages, refreshed by every sync that parses a team
+-- page. Served by /api/stats instead of embedding the Sharks Ice stats site.
+CREATE TABLE IF NOT EXISTS player_stats(
+    team_id                 INTEGER     NOT NULL REFERENCES team(team_id),
+    season                  INTEGER     NOT NULL,
+    name                    TEXT        NOT NULL,
+    league_id               INTEGER,
+    number                  TEXT,
+    games_played            INTEGER,
+    goals                   INTEGER,
+    assists                 INTEGER,
+    points                  INTEGER,
+    power_play_goals        INTEGER,
+    power_play_assists      INTEGER,
+    short_handed_goals      INTEGER,
+    short_handed_assists    INTEGER,
+    game_winning_goals      INTEGER,
+    game_winning_assists    INTEGER,
+    penalty_shot_goals      INTEGER,
+    empty_net_goals         INTEGER,
+    shootout_goals          INTEGER,
+    hat_tricks              INTEGER,
+    updated_at              TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (team_id, season, name)
+);
+
+CREATE TABLE IF NOT EXISTS goalie_stats(
+    team_id                 INTEGER     NOT NULL REFERENCES team(team_id),
+    season                  INTEGER     NOT NULL,
+    name                    TEXT        NOT NULL,
+    league_id               INTEGER,
+    number                  TEXT,
+    games_played            INTEGER,
+    shots                   INTEGER,
+    goals_against           INTEGER,
+    goals_against_average   DOUBLE PRECISION,
+    save_percentage         DOUBLE PRECISION,
+    shutouts                INTEGER,
+    wins                    INTEGER,
+    losses                  INTEGER,
+    overtime_losses         INTEGER,
+    ties                    INTEGER,
+    goals                   INTEGER,
+    assists                 INTEGER,
+    points                  INTEGER,
+    updated_at              TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (team_id, season, name)
+);
+
+-- league leaders, per team lookups use the primary key
+CREATE INDEX IF NOT EXISTS ix_player_stats_league_season_points ON player_stats(league_id, season, points DESC NULLS LAST);
+CREATE INDEX IF NOT EXISTS ix_goalie_stats_league_season_save_percentage ON goalie_stats(league_id, season, save_percentage DESC NULLS LAST);
+
+-- unchanged team pages are skipped by the synchronizer, forget their versions so the next sync
+-- parses every team page and fills in the stats
+DELETE FROM page_fetch_state;
@@ -0,0 +1,31 @@
+-- Shootouts and the season of each game, so standings can be computed from the stored results
+ALTER TABLE game ADD COLUMN IF NOT EXISTS shootout BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE game ADD COLUMN IF NOT EXISTS season INTEGER;
+
+-- Each team's record in its level for a season, kept up to date by the synchronizer as games
+-- complete. Served by /api/standings.
+CREATE TABLE IF NOT EXISTS standings(
+    league_id           INTEGER     NOT NULL,
+    season              INTEGER     NOT NULL,
+    level               TEXT        NOT NULL,
+    team_id             INTEGER     NOT NULL REFERENCES team(team_id),
+    games_played        INTEGER     NOT NULL DEFAULT 0,
+    wins                INTEGER     NOT NULL DEFAULT 0,
+    losses              INTEGER     NOT NULL DEFAULT 0,
+    ties                INTEGER     NOT NULL DEFAULT 0,
+    shootout_wins       INTEGER     NOT NULL DEFAULT 0,
+    shootout_losses     INTEGER     NOT NULL DEFAULT 0,
+    points              INTEGER     NOT NULL DEFAULT 0,
+    goals_for           INTEGER     NOT NULL DEFAULT 0,
+    goals_against       INTEGER     NOT NULL DEFAULT 0,
+    streak_result       TEXT,
+    streak_length       INTEGER,
+    last_game_at        TIMESTAMP WITH TIME ZONE,
+    updated_at          TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (league_id, season, level, team_id)
+);
+
+-- the scores of games stored before they completed were never updated, and no game has its
+-- season yet. Forget the page versions so the next sync parses every team page, which fills in
+-- both and adds the completed games to the standings.
+DELETE FROM page_fetch_state;
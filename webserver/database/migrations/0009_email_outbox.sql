@@ -0,0 +1,20 @@
+-- Emails queued by the API handlers in the same transaction as the change they are about, and
+-- sent in the background by the leader's outbox job. idempotency_key makes a repeated enqueue of
+-- the same email a no-op.
+CREATE TABLE IF NOT EXISTS email_outbox(
+    outbox_id           SERIAL      PRIMARY KEY,
+    idempotency_key     TEXT        NOT NULL UNIQUE,
+    template            TEXT        NOT NULL,
+    data                JSON        NOT NULL,
+    to_emails           JSON        NOT NULL,
+    status              TEXT        NOT NULL DEFAULT 'pending',
+    attempts            INTEGER     NOT NULL DEFAULT 0,
+    claim_token         TEXT,
+    next_attempt_at     TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at          TIMESTAMP WITH TIME ZONE,
+    sent_at             TIMESTAMP WITH TIME ZONE
+);
+
+-- the outbox job polls for the due emails, the sent and failed ones are never read again
+CREATE INDEX IF NOT EXISTS ix_email_outbox_due ON email_outbox(next_attempt_at)
+    WHERE status IN ('pending', 'sending');
@@ -0,0 +1,69 @@
+-- Team names are unique regardless of case. The league syncs run concurrently and add teams with
+-- INSERT ... ON CONFLICT DO NOTHING (Database.add_team and add_games), this index is what keeps
+-- two syncs from adding the same team. Replaces the plain lower(name) index of 0003.
+
+-- Merge the teams already added twice, names that differ only by case, into the team with the
+-- lowest team_id, which is the one Database.find_teams_by_name returns.
+CREATE TEMP TABLE team_merge ON COMMIT DROP AS
+SELECT team.team_id, kept.team_id AS kept_team_id
+FROM team
+JOIN (SELECT lower(name) AS lower_name, MIN(team_id) AS team_id FROM team GROUP BY lower(name)) kept
+  ON lower(team.name) = kept.lower_name
+WHERE team.team_id <> kept.team_id;
+
+UPDATE game SET home_team_id = team_merge.kept_team_id
+FROM team_merge WHERE game.home_team_id = team_merge.team_id;
+
+UPDATE game SET away_team_id = team_merge.kept_team_id
+FROM team_merge WHERE game.away_team_id = team_merge.team_id;
+
+-- a player on more than one of the copies keeps their row on the lowest team_id
+DELETE FROM team_player
+USING team_merge
+WHERE team_player.team_id = team_merge.team_id
+  AND EXISTS (SELECT 1 FROM team_player other
+              WHERE other.user_id = team_player.user_id
+                AND other.team_id < team_player.team_id
+                AND (other.team_id = team_merge.kept_team_id
+                     OR other.team_id IN (SELECT team_id FROM team_merge merged
+                                          WHERE merged.kept_team_id = team_merge.kept_team_id)));
+
+UPDATE team_player SET team_id = team_merge.kept_team_id
+FROM team_merge WHERE team_player.team_id = team_merge.team_id;
+
+UPDATE team_goalie SET team_id = team_merge.kept_team_id
+FROM team_merge WHERE team_goalie.team_id = team_merge.team_id;
+
+UPDATE game_reply SET team_id = team_merge.kept_team_id
+FROM team_merge WHERE game_reply.team_id = team_merge.team_id;
+
+UPDATE game_chat_message SET team_id = team_merge.kept_team_id
+FROM team_merge WHERE game_chat_message.team_id = team_merge.team_id;
+
+-- recount the reply summaries of the merged teams, same tallies as 0002
+DELETE FROM game_reply_summary
+WHERE team_id IN (SELECT team_id FROM team_merge UNION SELECT kept_team_id FROM team_merge);
+
+INSERT INTO game_reply_summary(game_id, team_id, count_yes, count_no, count_maybe, count_goalie)
+SELECT game_id,
+       team_id,
+       SUM(CASE WHEN response = 'yes' AND NOT COALESCE(is_goalie, FALSE) THEN 1 ELSE 0 END),
+       SUM(CASE WHEN response = 'no' THEN 1 ELSE 0 END),
+       SUM(CASE WHEN response = 'maybe' THEN 1 ELSE 0 END),
+       SUM(CASE WHEN response = 'yes' AND COALESCE(is_goalie, FALSE) THEN 1 ELSE 0 END)
+FROM game_reply
+WHERE team_id IN (SELECT kept_team_id FROM team_merge)
+GROUP BY game_id, team_id;
+
+-- the stats and standings of the copies are dropped, the next sync parses the stats again and
+-- python -m webserver.database.rebuild_standings recounts the standings from the merged games
+DELETE FROM player_stats WHERE team_id IN (SELECT team_id FROM team_merge);
+DELETE FROM goalie_stats WHERE team_id IN (SELECT team_id FROM team_merge);
+DELETE FROM standings WHERE team_id IN (SELECT team_id FROM team_merge);
+
+DELETE FROM team WHERE team_id IN (SELECT team_id FROM team_merge);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_team_lower_name_unique
+    ON team(lower(name));
+
+DROP INDEX IF EXISTS ix_team_lower_name;
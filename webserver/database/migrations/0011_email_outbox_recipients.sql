@@ -0,0 +1,12 @@
+-- The recipients of each outbox email as one sorted, lower cased, comma separated string, see
+-- hockey_db.outbox_recipients. Emails to the same recipients are sent in the order they were
+-- queued: one is not claimed while an earlier one to them waits for a retry.
+ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS recipients TEXT;
+
+UPDATE email_outbox
+SET recipients = (SELECT string_agg(lower(address), ',' ORDER BY lower(address))
+                  FROM json_array_elements_text(to_emails) AS address)
+WHERE recipients IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_email_outbox_recipients ON email_outbox(recipients, outbox_id)
+    WHERE status IN ('pending', 'sending');
@@ -0,0 +1,4 @@
+-- When a player's role or join request was last changed. The role changed email is keyed on the
+-- version of the row it replaces, so a duplicate request queues it once while every real change
+-- is sent. Rows changed before this migration have no version yet.
+ALTER TABLE team_player ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,17 @@
+'''
+rebuild_reply_summary
+
+Script to backfill (or repair) the game_reply_summary table from the game_reply table. Creates the
+table if it does not exist yet.
+
+To run: python -m webserver.database.rebuild_reply_summary
+'''
+from webserver.database.alchemy_models import GameReplySummary
+from webserver.database.hockey_db import Database
+
+db = Database()
+
+GameReplySummary.__table__.create(db.engine, checkfirst=True)
+row_count = db.rebuild_game_reply_summary()
+
+print(f'Rebuilt game_reply_summary with {row_count} rows')
@@ -0,0 +1,17 @@
+'''
+rebuild_standings
+
+Script to backfill (or repair) the standings table from the completed games. Creates the table if
+it does not exist yet.
+
+To run: python -m webserver.database.rebuild_standings
+'''
+from webserver.database.alchemy_models import Standing
+from webserver.database.hockey_db import Database
+
+db = Database()
+
+Standing.__table__.create(db.engine, checkfirst=True)
+row_count = db.rebuild_standings()
+
+print(f'Rebuilt standings with {row_count} rows')
@@ -4,11 +4,16 @@ email
 Contains all of the methods for outgoing communication from the service. Currently just email.
 Maybe include SMS in the future.
 '''
+from concurrent.futures import ThreadPoolExecutor as NotifyPoolExecutor, as_completed
 from datetime import datetime, timezone
 from enum import Enum
+import hashlib
 import html
+import json
+import math
 import os
 from string import Template
+import threading
 import time
 from typing import List, Dict
 from zoneinfo import ZoneInfo
@@ -18,6 +23,7 @@ from botocore.exceptions import ClientError, NoCredentialsError, PartialCredenti
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from webserver.logging import write_log
+from webserver.rate_limiter import TokenBucket
 from webserver.utils import timeuntil
 
 class EmailTemplate(Enum):
@@ -33,19 +39,320 @@ class EmailTemplate(Enum):
     ROLE_UPDATED       = 'd-683a41dc2a694123815a1fe3ea8a7881'
     REMOVED_FROM_TEAM  = 'd-0e95577f623d4b5ca53307296856c0f9'
     REPLY_CHANGED      = 'd-a837b5fd27544b688ce72a5315f6bd65'
+    GAMES_CANCELLED    = None # no SendGrid template, AWS only
 
 FROM_ADDRESS = 'jesse@hockeyreply.com'
 USE_AWS = True
 
-client = boto3.client('ses', region_name='us-west-2')
+# Emails queued without an idempotency key are deduplicated on their content within this window.
+# Emails about a change pass a change_key instead, so a change back to an earlier state is sent.
+OUTBOX_IDEMPOTENCY_WINDOW_SECONDS = 10 * 60
 
-def send_email(template: EmailTemplate, data: Dict, to_emails):
-    ''' Sends out email. All emails funnel through this function
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'email_templates')
+TEMPLATE_PARTS = ['subj', 'txt', 'html']
+
+# SES bulk templated sends take at most this many destinations per call
+SES_BULK_MAX_DESTINATIONS = 50
+
+if os.getenv('HOCKEY_REPLY_LOCAL_SES'):
+    from webserver.local_ses import LocalSES
+    client = LocalSES()
+else:
+    client = boto3.client('ses', region_name='us-west-2')
+
+PACIFIC = ZoneInfo('US/Pacific')
+
+# games whose coming soon emails are sent at once
+NOTIFY_MAX_CONCURRENT_GAMES = 4
+
+# SES templates created by this process, see ensure_ses_template
+ses_templates_created = set()
+ses_templates_lock = threading.Lock()
+
+# Every send in the process takes a token per recipient from send_rate_limiter, which refills at
+# the SES maximum send rate. A send that would wait longer than SEND_RATE_MAX_WAIT_SECONDS for its
+# tokens, or that SES throttles anyway, raises EmailThrottled and is requeued in the outbox.
+SES_MAX_SEND_RATE = float(os.getenv('HOCKEY_REPLY_SES_MAX_SEND_RATE', 14))
+SEND_RATE_MAX_WAIT_SECONDS = 2
+# sends from the API handlers do not wait for tokens at all, a throttled email is queued at once
+REQUEST_SEND_MAX_WAIT_SECONDS = 0
+send_rate_limiter = TokenBucket(SES_MAX_SEND_RATE, max(int(SES_MAX_SEND_RATE), 1))
+
+class EmailThrottled(Exception):
+    ''' The email was not sent to stay under the send rate, and should be requeued '''
+
+def template_placeholders(template):
+    ''' Names of the placeholders in a string.Template. Raises ValueError on a malformed one, which
+        substitute() would otherwise only hit when sending.
+    '''
+    names = set()
+    for match in template.pattern.finditer(template.template):
+        if match.group('invalid') is not None:
+            raise ValueError(f'Invalid placeholder at offset {match.start("invalid")}')
+
+        name = match.group('named') or match.group('braced')
+        if name:
+            names.add(name)
+
+    return names
+
+def ses_template_part(template):
+    ''' A string.Template in the SES template syntax. Values are inserted unescaped ({{{name}}}),
+        like string.Template does for the regular sends.
+    '''
+    def replace(match):
+        if match.group('escaped') is not None:
+            return template.delimiter
+
+        return '{{{' + (match.group('named') or match.group('braced')) + '}}}'
+
+    return template.pattern.sub(replace, template.template)
+
+class CompiledTemplate:
+    ''' The subject, text and html parts of an email template, compiled once '''
+
+    def __init__(self, template):
+        self.template = template
+        self.paths = {part: os.path.join(TEMPLATE_DIR, f'{template.name.lower()}.{part}') for part in TEMPLATE_PARTS}
+        self.mtimes = {part: os.path.getmtime(path) for part, path in self.paths.items()}
+
+        self.parts = {}
+        self.placeholders = set()
+        for part, path in self.paths.items():
+            with open(path, 'r') as f:
+                self.parts[part] = Template(f.read())
+
+            try:
+                self.placeholders |= template_placeholders(self.parts[part])
+            except ValueError as e:
+                raise ValueError(f'{path}: {e}')
+
+        # named after a hash of the content, so an edited template is created in SES as a new one
+        ses_parts = {'SubjectPart': ses_template_part(self.parts['subj']),
+                     'TextPart': ses_template_part(self.parts['txt']),
+                     'HtmlPart': ses_template_part(self.parts['html'])}
+        content_hash = hashlib.sha256(json.dumps(ses_parts, sort_keys=True).encode()).hexdigest()
+        self.ses_template = dict(ses_parts, TemplateName=f'hockey_reply_{template.name.lower()}_{content_hash[:12]}')
+
+    def is_stale(self):
+        return any(os.path.getmtime(path) != self.mtimes[part] for part, path in self.paths.items())
+
+    def missing_keys(self, data):
+        return self.placeholders - data.keys()
+
+    def render(self, data):
+        ''' Returns (subject, text, html). Raises KeyError if data is missing placeholders. '''
+        missing = self.missing_keys(data)
+        if missing:
+            raise KeyError(f'{self.template.name} is missing {sorted(missing)}')
+
+        return tuple(self.parts[part].substitute(data) for part in TEMPLATE_PARTS)
+
+class TemplateRegistry:
+    ''' Compiles each template the first time it is used. Outside of prod the files are checked
+        on every use and recompiled when edited, so template changes show up without a restart.
+    '''
+    def __init__(self, reload=None):
+        self.reload = reload if reload is not None else os.getenv('HOCKEY_REPLY_ENV') != 'prod'
+        self.templates = {}
+        self.lock = threading.Lock()
+
+    def get(self, template):
+        compiled = self.templates.get(template)
+
+        if compiled is None or (self.reload and compiled.is_stale()):
+            with self.lock:
+                compiled = CompiledTemplate(template)
+                self.templates[template] = compiled
+
+        return compiled
+
+    def load_all(self):
+        ''' Compiles every template, raising on a missing file or malformed placeholder '''
+        for template in EmailTemplate:
+            self.get(template)
+
+templates = TemplateRegistry()
+
+def send_email(template: EmailTemplate, data: Dict, to_emails, max_wait_seconds=SEND_RATE_MAX_WAIT_SECONDS):
+    ''' Sends out email. All emails funnel through this function. Returns whether it was sent,
+        raises EmailThrottled if it should be requeued. Waits up to max_wait_seconds for the send
+        rate limiter.
     '''
+    if not isinstance(to_emails, list):
+        to_emails = [to_emails]
+
+    # the limiter grants at most its capacity at once, so an email to more recipients takes its
+    # tokens in parts. Only the first part can be throttled, once it is granted the email waits
+    # for the rest at the send rate. A send that may not wait can not take them in parts.
+    if not max_wait_seconds and len(to_emails) > send_rate_limiter.capacity:
+        raise EmailThrottled(f'{template.name} to {to_emails}')
+
+    for start in range(0, len(to_emails), send_rate_limiter.capacity):
+        tokens = min(send_rate_limiter.capacity, len(to_emails) - start)
+
+        if not send_rate_limiter.acquire(tokens, max_wait_seconds if start == 0 else math.inf):
+            raise EmailThrottled(f'{template.name} to {to_emails}')
+
     if USE_AWS:
-        send_email_aws(template, data, to_emails, 1)
+        return send_email_aws(template, data, to_emails)
     else:
-        send_email_sendgrid(template, data, to_emails)
+        return send_email_sendgrid(template, data, to_emails)
+
+def send_or_queue_email(db, template: EmailTemplate, data: Dict, to_emails,
+                        max_wait_seconds=SEND_RATE_MAX_WAIT_SECONDS):
+    ''' Sends an email now, or queues it in the outbox if it is throttled. Commits db after
+        queueing, so only call it once the caller's changes are committed. API handlers pass
+        REQUEST_SEND_MAX_WAIT_SECONDS, so the request never waits for the send rate.
+    '''
+    try:
+        return send_email(template, data, to_emails, max_wait_seconds)
+    except EmailThrottled:
+        queue_email(db, template, data, to_emails)
+        db.commit_changes()
+        return True
+
+def queue_throttled_emails(db, template: EmailTemplate, data: Dict, recipients):
+    ''' Queues the throttled recipients of a send_bulk_email in the outbox, one email each, and
+        commits db
+    '''
+    if not recipients:
+        return
+
+    for email, recipient_data in recipients:
+        queue_email(db, template, dict(data, **recipient_data), email)
+    db.commit_changes()
+
+def change_key(template: EmailTemplate, *change):
+    ''' Idempotency key of an email about a change, from the values that identify the change
+        (e.g. the row and the version of it that was replaced)
+    '''
+    content = json.dumps([template.name, *change], default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def queue_email(db, template: EmailTemplate, data: Dict, to_emails, idempotency_key=None):
+    ''' Queues an email in the outbox, to be sent in the background by email_outbox.OutboxWorker.
+        The caller commits db, so the email only goes out if the change it is about is saved.
+        Emails about a change pass a change_key. Without an idempotency_key the same email to
+        the same people is queued once per OUTBOX_IDEMPOTENCY_WINDOW_SECONDS, which drops the
+        duplicates of a resent email.
+    '''
+    if not isinstance(to_emails, list):
+        to_emails = [to_emails]
+
+    if not to_emails:
+        return
+
+    missing = templates.get(template).missing_keys(data)
+    if missing:
+        write_log('ERROR', f'Not queueing {template.name}, data is missing {sorted(missing)}')
+        return
+
+    if idempotency_key is None:
+        window = int(time.time() // OUTBOX_IDEMPOTENCY_WINDOW_SECONDS)
+        content = json.dumps([template.name, sorted(to_emails), data, window], sort_keys=True)
+        idempotency_key = hashlib.sha256(content.encode()).hexdigest()
+
+    db.enqueue_email(template.name, data, to_emails, idempotency_key)
+
+def send_bulk_email(template: EmailTemplate, data: Dict, recipients):
+    ''' Sends template to many recipients with SES bulk templated sends, one call per
+        SES_BULK_MAX_DESTINATIONS recipients, or fewer so each call fits the send rate limiter. data is shared by all of the emails, recipients is a
+        list of (email, data) with the values that differ per recipient. Returns the emails of
+        the recipients whose sends failed, and the (email, data) of those that were throttled,
+        for queue_throttled_emails.
+    '''
+    compiled = templates.get(template)
+    failed = []
+    throttled = []
+    valid = []
+
+    for email, recipient_data in recipients:
+        missing = compiled.placeholders - data.keys() - recipient_data.keys()
+        if missing:
+            write_log('ERROR', f'Not sending {template.name} to {email}, data is missing {sorted(missing)}')
+            failed.append(email)
+        else:
+            valid.append((email, recipient_data))
+
+    if not valid:
+        return failed, throttled
+
+    if not USE_AWS:
+        for email, recipient_data in valid:
+            try:
+                if not send_email(template, dict(data, **recipient_data), email):
+                    failed.append(email)
+            except EmailThrottled:
+                throttled.append((email, recipient_data))
+        return failed, throttled
+
+    try:
+        template_name = ensure_ses_template(compiled)
+    except Exception as e:
+        write_log('ERROR', f'Creating the SES template for {template.name} failed: {e}')
+        return failed + [email for email, _ in valid], throttled
+
+    chunk_size = min(SES_BULK_MAX_DESTINATIONS, send_rate_limiter.capacity)
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+
+        if not send_rate_limiter.acquire(len(chunk), SEND_RATE_MAX_WAIT_SECONDS):
+            throttled.extend(chunk)
+            continue
+
+        try:
+            response = client.send_bulk_templated_email(
+                Source=FROM_ADDRESS,
+                Template=template_name,
+                DefaultTemplateData=json.dumps(data),
+                Destinations=[{
+                    'Destination': {'ToAddresses': [email]},
+                    'ReplacementTemplateData': json.dumps(recipient_data)
+                } for email, recipient_data in chunk]
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'Throttling':
+                send_rate_limiter.throttle()
+                throttled.extend(chunk)
+            else:
+                write_log('ERROR', f'Sending {template.name} to {len(chunk)} recipients failed: {e}')
+                failed.extend(email for email, _ in chunk)
+            continue
+        except Exception as e:
+            write_log('ERROR', f'Sending {template.name} to {len(chunk)} recipients failed: {e}')
+            failed.extend(email for email, _ in chunk)
+            continue
+
+        # the statuses are in the order of the destinations
+        for recipient, status in zip(chunk, response['Status']):
+            if status['Status'] == 'AccountThrottled':
+                send_rate_limiter.throttle()
+                throttled.append(recipient)
+            elif status['Status'] != 'Success':
+                write_log('ERROR', f'Sending {template.name} to {recipient[0]} failed: {status["Status"]} {status.get("Error", "")}')
+                failed.append(recipient[0])
+
+    return failed, throttled
+
+def ensure_ses_template(compiled):
+    ''' Creates the SES template of a compiled template, once per process, and returns its name '''
+    name = compiled.ses_template['TemplateName']
+
+    if name not in ses_templates_created:
+        # held while creating, so concurrent sends of a new template create it once
+        with ses_templates_lock:
+            if name not in ses_templates_created:
+                try:
+                    client.create_template(Template=compiled.ses_template)
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'AlreadyExists':
+                        raise
+
+                ses_templates_created.add(name)
+
+    return name
 
 def send_email_sendgrid(template, data, to_emails):
     message = Mail(
@@ -60,26 +367,20 @@ def send_email_sendgrid(template, data, to_emails):
         response = sg.send(message)
     except Exception as e:
         print(e)
+        return False
 
-def send_email_aws(template, data, to_emails, delay_on_err_sec):
+    return True
 
-    if not isinstance(to_emails, list):
-        to_emails = [to_emails]
+def send_email_aws(template, data, to_emails):
 
-    text_content = None
-    html_content = None
-    subj_content = None
-    with open(f'webserver/email_templates/{template.name.lower()}.html', 'r') as f:
-        html_content = f.read()
-    with open(f'webserver/email_templates/{template.name.lower()}.txt', 'r') as f:
-        text_content = f.read()
-    with open(f'webserver/email_templates/{template.name.lower()}.subj', 'r') as f:
-        subj_content = f.read()
-
-    html_escaped = html.escape(html_content)
-    html_populated = Template(html_content).substitute(data)
-    text_populated = Template(text_content).substitute(data)
-    subj_populated = Template(subj_content).substitute(data)
+    compiled = templates.get(template)
+
+    missing = compiled.missing_keys(data)
+    if missing:
+        write_log('ERROR', f'Not sending {template.name}, data is missing {sorted(missing)}')
+        return False
+
+    subj_populated, text_populated, html_populated = compiled.render(data)
 
     try:
         response = client.send_email(
@@ -110,26 +411,27 @@ def send_email_aws(template, data, to_emails, delay_on_err_sec):
         print("Error: Incomplete AWS credentials found.")
     except ClientError as e:
         if e.response['Error']['Code'] == 'Throttling':
+            send_rate_limiter.throttle()
+            raise EmailThrottled(f'{template.name} to {to_emails}: {e}')
 
-            MAX_DELAY = 10
-            if delay_on_err_sec <= MAX_DELAY:
-                time.sleep(delay_on_err_sec)
-                send_email_aws(template, data, to_emails, delay_on_err_sec * 2)
-            else:
-                write_log('ERROR', f'Aborting email because exceeded max delay: {template.name}')
+        write_log('ERROR', f'Sending {template.name} failed: {e}')
     except Exception as e:
         print(f"Error: {e}")
+    else:
+        return True
+
+    return False
 
 def send_welcome():
     ''' TODO send an abbreviated version of the docs?
     '''
     pass
 
-def send_forgot_password(email, token):
+def send_forgot_password(db, email, token):
     email_data = {
         'token': token
     }
-    send_email(EmailTemplate.FORGOT_PASSWORD, email_data, email)
+    send_or_queue_email(db, EmailTemplate.FORGOT_PASSWORD, email_data, email, REQUEST_SEND_MAX_WAIT_SECONDS)
 
 def send_game_schedule_change():
     pass
@@ -138,8 +440,13 @@ def send_new_games():
     pass
 
 def send_reply_was_changed(db, user, team, game, reply, updated_by_user):
-    ''' Notify that your reply was changed by someone else (captain)
+    ''' Notify that your reply was changed by someone else (captain). Queued, the caller commits,
+        so call it before the reply is saved. Nothing is sent if the reply stays the same.
     '''
+    previous = db.game_reply_for_game_and_user(game.game_id, team.team_id, user.user_id)
+    if previous is not None and previous.response == reply:
+        return
+
     vs_team = db.get_team_by_id(game.home_team_id if team.team_id == game.away_team_id else game.away_team_id)
 
     pacific = ZoneInfo('US/Pacific')
@@ -147,31 +454,41 @@ def send_reply_was_changed(db, user, team, game, reply, updated_by_user):
         'name': user.first_name,
         'team': team.name,
         'team_id': team.team_id,
+        'user_team_id': team.team_id,
         'game_id': game.game_id,
         'vs': vs_team.name,
         'reply': reply.capitalize(),
         'scheduled_at': game.scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p")
     }
 
-    send_email(EmailTemplate.REPLY_CHANGED, email_data, user.email)
+    # keyed on the new reply and the version of the reply it replaces, so a resubmitted change
+    # is queued once but changing the reply back again is not taken for a duplicate
+    queue_email(db, EmailTemplate.REPLY_CHANGED, email_data, user.email,
+                change_key(EmailTemplate.REPLY_CHANGED, game.game_id, user.user_id, reply,
+                           previous.modified_at if previous else None))
     write_log('INFO', f'Notify reply was changed for {user.email}')
 
-def send_removed_from_team(team, removed_user, updated_by_user):
-    ''' condolences, you have been kicked off of the team
+def send_removed_from_team(db, team, removed_player, updated_by_user):
+    ''' condolences, you have been kicked off of the team. removed_player is the TeamPlayer that
+        was removed. Queued, the caller commits.
     '''
+    removed_user = removed_player.player
     email_data = {
         'name': removed_user.first_name,
         'team': team.name,
         'updated_by': updated_by_user.first_name,
     }
 
-    send_email(EmailTemplate.REMOVED_FROM_TEAM, email_data, removed_user.email)
+    # keyed on the membership that was removed, a player who rejoins has a new joined_at
+    queue_email(db, EmailTemplate.REMOVED_FROM_TEAM, email_data, removed_user.email,
+                change_key(EmailTemplate.REMOVED_FROM_TEAM, team.team_id, removed_user.user_id, removed_player.joined_at))
     write_log('INFO', f'Notify role change to {removed_user.email}')
 
-def send_team_role_change(team, updated_player, updated_by_user):
+def send_team_role_change(db, team, updated_player, updated_by_user, previous_updated_at):
     ''' Send email to a player whose role has changed (like sub -> full). This includes
         players who requested to join teams who will receive this email when their request
-        is accepted.
+        is accepted. Only called when the role or the request changed. previous_updated_at is
+        the updated_at of the player's row before the change. Queued, the caller commits.
     '''
     role = ''
     if updated_player.role == 'captain':
@@ -190,11 +507,16 @@ def send_team_role_change(team, updated_player, updated_by_user):
         'role': role
     }
 
-    send_email(EmailTemplate.ROLE_UPDATED, email_data, updated_player.player.email)
+    # keyed on the new role and the version of the row it replaces, so a duplicate of the
+    # request is queued once but changing the role back again is sent
+    queue_email(db, EmailTemplate.ROLE_UPDATED, email_data, updated_player.player.email,
+                change_key(EmailTemplate.ROLE_UPDATED, team.team_id, updated_player.user_id, updated_player.joined_at,
+                           previous_updated_at, updated_player.role))
     write_log('INFO', f'Notify role change to {updated_player.player.email}')
 
-def send_player_join_request(requesting_player, team):
-    ''' Notifies all of the captains on a team whenever a new player requests to join their team
+def send_player_join_request(db, requesting_player, team):
+    ''' Notifies all of the captains on a team whenever a new player requests to join their team.
+        Queued, the caller commits.
     '''
     email_data = {
         'name': requesting_player.player.first_name,
@@ -208,7 +530,9 @@ def send_player_join_request(requesting_player, team):
         if player.role == 'captain':
             to_emails.append(player.player.email)
 
-    send_email(EmailTemplate.JOIN_REQUEST, email_data, to_emails)
+    queue_email(db, EmailTemplate.JOIN_REQUEST, email_data, to_emails,
+                change_key(EmailTemplate.JOIN_REQUEST, team.team_id, requesting_player.player.user_id,
+                           requesting_player.joined_at))
     write_log('INFO', f'Notify join request {requesting_player.player.email} to {to_emails}')
 
 def send_game_coming_soon(db, game):
@@ -216,51 +540,95 @@ def send_game_coming_soon(db, game):
     send_game_coming_soon is called from the synchronizer worker thread, so use its db instance
     rather than the global requests one
     '''
-    for team_id in [game.home_team_id, game.away_team_id]:
+    for _ in send_games_coming_soon(db, [game]):
+        pass
 
-        team = db.get_team_by_id(team_id)
-        vs_team = db.get_team_by_id(game.home_team_id if team_id == game.away_team_id else game.away_team_id)
+def send_games_coming_soon(db, games):
+    '''
+    Sends the coming soon emails of games to the players of both teams. Rosters, replies and reply
+    counts of all of the games are read up front in a few queries, then each game's emails are
+    sent on a pool of NOTIFY_MAX_CONCURRENT_GAMES threads, which do not touch db. A generator,
+    yields each game once its emails are sent (or queued when throttled).
+    '''
+    if not games:
+        return
 
-        replies = db.game_replies_for_game(game.game_id, team_id)
-        confimed_yes = 0
-        goalie = 'NO GOALIE!'
+    game_ids = [game.game_id for game in games]
+    team_ids = {team_id for game in games for team_id in [game.home_team_id, game.away_team_id]}
 
-        for reply in replies:
-            if reply.response == 'yes' and not reply.is_goalie:
-                confimed_yes += 1
+    teams = db.get_teams_by_id(team_ids)
+    rosters = db.get_notification_rosters(team_ids)
+    replies = db.get_game_replies_by_user(game_ids)
+    summaries = db.get_game_reply_summaries(game_ids)
 
-            if reply.is_goalie:
-                goalie = 'Yes'
+    now = datetime.now(timezone.utc).astimezone(PACIFIC)
 
-        for player in team.players:
+    # (game, [(email_data, recipients)]) with the emails of each team, built here so the send
+    # threads only send
+    game_emails = []
+    for game in games:
+        scheduled_at = game.scheduled_at.astimezone(PACIFIC)
+        scheduled_at_text = scheduled_at.strftime("%a, %b %d @ %I:%M %p")
+        scheduled_how_soon = timeuntil(now, scheduled_at).replace(' ', ' ')
 
-            if player.role == '':
+        team_emails = []
+        for team_id in [game.home_team_id, game.away_team_id]:
+
+            team = teams.get(team_id)
+            vs_team = teams.get(game.home_team_id if team_id == game.away_team_id else game.away_team_id)
+            if team is None or vs_team is None:
                 continue
 
-            user_reply = ''
-            for reply in replies:
-                if reply.user_id == player.user_id:
-                    user_reply = reply.response
+            confimed_yes = 0
+            goalie = 'NO GOALIE!'
+
+            summary = summaries.get((game.game_id, team_id))
+            if summary:
+                confimed_yes = summary.count_yes
+
+                if summary.count_goalie > 0:
+                    goalie = 'Yes'
 
-            pacific = ZoneInfo('US/Pacific')
-            user = db.get_user_by_id(player.user_id)
             email_data = {
-                'name': user.first_name,
-                'user_id': user.user_id,
                 'game_id': game.game_id,
                 'user_team_id': team.team_id,
                 'team': team.name,
-                'scheduled_at': game.scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p"),
-                'scheduled_how_soon': timeuntil(datetime.now(timezone.utc).astimezone(pacific), game.scheduled_at.astimezone(pacific)).replace(' ', ' '),
+                'scheduled_at': scheduled_at_text,
+                'scheduled_how_soon': scheduled_how_soon,
                 'rink': game.rink,
                 'vs': vs_team.name,
-                'reply': user_reply.capitalize(),
                 'confirmed_players': f'{confimed_yes}',
                 'goalie': goalie
             }
 
-            send_email(EmailTemplate.GAME_COMING_SOON, email_data, user.email)
-            write_log('INFO', f'Notify coming soon {game.game_id} to {user.email}')
+            team_replies = replies.get((game.game_id, team_id), {})
+            recipients = [(user.email, {
+                'name': user.first_name,
+                'user_id': user.user_id,
+                'reply': (team_replies.get(user.user_id) or '').capitalize()
+            }) for user in rosters[team_id]]
+
+            team_emails.append((email_data, recipients))
+
+        game_emails.append((game, team_emails))
+
+    def send_game(team_emails):
+        # one SES call per SES_BULK_MAX_DESTINATIONS players rather than per player
+        return [send_bulk_email(EmailTemplate.GAME_COMING_SOON, email_data, recipients)
+                for email_data, recipients in team_emails]
+
+    with NotifyPoolExecutor(max_workers=NOTIFY_MAX_CONCURRENT_GAMES) as executor:
+        futures = {executor.submit(send_game, team_emails): (game, team_emails) for game, team_emails in game_emails}
+
+        for future in as_completed(futures):
+            game, team_emails = futures[future]
+
+            for (email_data, recipients), (failed, throttled) in zip(team_emails, future.result()):
+                queue_throttled_emails(db, EmailTemplate.GAME_COMING_SOON, email_data, throttled)
+                write_log('INFO', f'Notify coming soon {game.game_id} to {[email for email, _ in recipients]}'
+                                  f'{f", failed {failed}" if failed else ""}{f", queued {len(throttled)}" if throttled else ""}')
+
+            yield game
 
 def send_game_time_changed(db, game, old_scheduled_at):
     '''
@@ -272,23 +640,72 @@ def send_game_time_changed(db, game, old_scheduled_at):
         team = db.get_team_by_id(team_id)
         vs_team = db.get_team_by_id(game.home_team_id if team_id == game.away_team_id else game.away_team_id)
 
+        pacific = ZoneInfo('US/Pacific')
+        email_data = {
+            'game_id': game.game_id,
+            'user_team_id': team.team_id,
+            'team': team.name,
+            'vs': vs_team.name,
+            'scheduled_at': game.scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p"),
+            'old_scheduled_at': old_scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p"),
+        }
+        recipients = []
+
+        for player in team.players:
+
+            if player.role == '':
+                continue
+
+            user = db.get_user_by_id(player.user_id)
+            recipients.append((user.email, {
+                'name': user.first_name,
+                'user_id': user.user_id
+            }))
+
+        failed, throttled = send_bulk_email(EmailTemplate.GAME_TIME_CHANGED, email_data, recipients)
+        queue_throttled_emails(db, EmailTemplate.GAME_TIME_CHANGED, email_data, throttled)
+        write_log('INFO', f'Notify game time changed to {game.scheduled_at} from {old_scheduled_at} for {game.game_id} '
+                          f'to {[email for email, _ in recipients]}{f", failed {failed}" if failed else ""}'
+                          f'{f", queued {len(throttled)}" if throttled else ""}')
+
+def send_games_cancelled(db, games):
+    '''
+    Notifies the players of each team once about all of its games that were removed from the
+    schedule in a sync. games are rows of (game_id, home_team_id, away_team_id, scheduled_at).
+    Called from the synchronizer worker thread, so use its db instance.
+    '''
+    games_by_team = {}
+    for game in games:
+        for team_id in [game.home_team_id, game.away_team_id]:
+            games_by_team.setdefault(team_id, []).append(game)
+
+    pacific = ZoneInfo('US/Pacific')
+
+    for team_id, team_games in games_by_team.items():
+
+        team = db.get_team_by_id(team_id)
+        if team is None:
+            continue
+
+        game_lines = []
+        for game in sorted(team_games, key=lambda game: game.scheduled_at):
+            vs_team = db.get_team_by_id(game.home_team_id if team_id == game.away_team_id else game.away_team_id)
+            game_lines.append(f'{game.scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p")} '
+                              f'VS: {vs_team.name if vs_team else "TBD"}')
+
         for player in team.players:
 
             if player.role == '':
                 continue
 
-            pacific = ZoneInfo('US/Pacific')
             user = db.get_user_by_id(player.user_id)
             email_data = {
                 'name': user.first_name,
-                'user_id': user.user_id,
-                'game_id': game.game_id,
-                'user_team_id': team.team_id,
                 'team': team.name,
-                'vs': vs_team.name,
-                'scheduled_at': game.scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p"),
-                'old_scheduled_at': old_scheduled_at.astimezone(pacific).strftime("%a, %b %d @ %I:%M %p"),
+                'team_id': team.team_id,
+                'games': '\n'.join(game_lines),
+                'games_html': '<br>'.join(html.escape(line) for line in game_lines)
             }
 
-            send_email(EmailTemplate.GAME_TIME_CHANGED, email_data, user.email)
-            write_log('INFO', f'Notify game time changed to {game.scheduled_at} from {old_scheduled_at} for {game.game_id} to {user.email}')
+            send_or_queue_email(db, EmailTemplate.GAMES_CANCELLED, email_data, user.email)
+            write_log('INFO', f'Notify games cancelled {[game.game_id for game in team_games]} to {user.email}')
@@ -0,0 +1,161 @@
+'''
+email_outbox
+
+Sends the emails that API handlers queue in the email_outbox table (see email.queue_email), so
+a slow or throttled email provider never adds to a request's latency. The leader's outbox job
+drains the table every few seconds: it claims a batch of due emails, sends them on a small
+thread pool (the emails to the same people in the order they were queued) and records the
+results. A failed send is retried with exponential backoff until MAX_ATTEMPTS, then left in the
+table as failed. A send held back by the email rate limiter is requeued without using up an
+attempt. The later emails to the same people wait until an earlier one is sent or has failed
+for good.
+'''
+from concurrent.futures import ThreadPoolExecutor as SendPoolExecutor
+import datetime
+import threading
+
+from webserver.database.hockey_db import Database, outbox_recipients
+from webserver.email import EmailTemplate, EmailThrottled, send_email, send_rate_limiter
+from webserver.logging import write_log
+
+class OutboxWorker:
+
+    BATCH_SIZE = 20
+    MAX_CONCURRENT_SENDS = 4
+    MAX_ATTEMPTS = 5
+    RETRY_BACKOFF_SECONDS = 60  # 1, 2, 4 then 8 minutes between attempts
+    THROTTLED_RETRY_SECONDS = 5
+
+    # an email claimed for this long without a result, e.g. because the process died while
+    # sending it, is claimed again
+    CLAIM_LEASE_SECONDS = 5 * 60
+
+    # sent and failed emails are kept this long for debugging
+    RETENTION_DAYS = 14
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.throttled = 0
+        self.last_drained_at = None
+
+    def drain(self):
+        ''' Sends the due emails, a batch at a time, until none are left '''
+        db = Database()
+
+        try:
+            while True:
+                token, emails = db.claim_outbox_emails(self.BATCH_SIZE, self.CLAIM_LEASE_SECONDS)
+                if not emails:
+                    break
+
+                # the emails to the same people are sent one after the other in the order they
+                # were queued, e.g. a reply changed to no and back to yes
+                in_order = {}
+                for email in emails:
+                    in_order.setdefault(outbox_recipients(email.to_emails), []).append(email)
+
+                with SendPoolExecutor(max_workers=self.MAX_CONCURRENT_SENDS) as executor:
+                    sent = {email.outbox_id: result
+                            for queue, results in zip(in_order.values(), executor.map(self.send_in_order, in_order.values()))
+                            for email, result in zip(queue, results)}
+                results = [sent[email.outbox_id] for email in emails]
+
+                db.finish_outbox_emails(token, [self.result(email, result)
+                                                for email, result in zip(emails, results)])
+
+                # the rest waits for the send rate, rather than being claimed only to be requeued
+                if len(emails) < self.BATCH_SIZE or 'throttled' in results:
+                    break
+        finally:
+            db.close()
+
+        with self.lock:
+            self.last_drained_at = datetime.datetime.now(datetime.timezone.utc)
+
+    def send_in_order(self, emails):
+        ''' Sends emails one after the other until one is not sent. The rest are held, they are
+            not attempted and wait for the one that was not sent (see
+            Database.claim_outbox_emails).
+        '''
+        results = []
+        for email in emails:
+            results.append(self.send(email) if all(result == 'sent' for result in results) else 'held')
+
+        return results
+
+    def send(self, email):
+        ''' Runs on the send pool, so must not touch the db session. Returns sent, failed or
+            throttled.
+        '''
+        try:
+            return 'sent' if send_email(EmailTemplate[email.template], email.data, email.to_emails) else 'failed'
+        except EmailThrottled:
+            return 'throttled'
+        except Exception as e:
+            write_log('ERROR', f'Outbox email {email.outbox_id} ({email.template}) failed: {e}')
+            return 'failed'
+
+    def result(self, email, result):
+        ''' (outbox_id, status, next_attempt_at, attempted) of a send for
+            Database.finish_outbox_emails
+        '''
+        now = datetime.datetime.now(datetime.timezone.utc)
+        attempts = email.attempts + 1
+
+        with self.lock:
+            if result == 'throttled':
+                self.throttled += 1
+                return (email.outbox_id, 'pending', now + datetime.timedelta(seconds=self.THROTTLED_RETRY_SECONDS), False)
+
+            if result == 'held':
+                return (email.outbox_id, 'pending', now, False)
+
+            if result == 'sent':
+                self.sent += 1
+                return (email.outbox_id, 'sent', None, True)
+
+            if attempts >= self.MAX_ATTEMPTS:
+                self.failed += 1
+                write_log('ERROR', f'Outbox email {email.outbox_id} ({email.template}) to {email.to_emails} '
+                                   f'failed {attempts} times, giving up')
+                return (email.outbox_id, 'failed', None, True)
+
+            self.retried += 1
+
+        retry_at = now + datetime.timedelta(seconds=self.RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        return (email.outbox_id, 'pending', retry_at, True)
+
+    def purge(self):
+        ''' Deletes the sent and failed emails older than RETENTION_DAYS '''
+        db = Database()
+
+        try:
+            db.purge_outbox_emails(datetime.datetime.now(datetime.timezone.utc) -
+                                   datetime.timedelta(days=self.RETENTION_DAYS))
+        finally:
+            db.close()
+
+    def status(self):
+        ''' Emails in the outbox by status, the sends of this process and the state of the send
+            rate limiter
+        '''
+        db = Database()
+
+        try:
+            queued = db.get_outbox_counts()
+        finally:
+            db.close()
+
+        with self.lock:
+            return {
+                'queued': queued,
+                'sent': self.sent,
+                'retried': self.retried,
+                'failed': self.failed,
+                'throttled': self.throttled,
+                'last_drained_at': self.last_drained_at.isoformat() if self.last_drained_at else None,
+                'rate_limiter': send_rate_limiter.stats()
+            }
@@ -0,0 +1,224 @@
+'''
+http_client
+
+HTTP client for the Sharks Ice site, shared by all of the synchronizer's fetches. Wraps a pooled
+keep-alive requests.Session with:
+  - connect and read timeouts on every request, so a hung connection can not stall a job
+  - bounded retries of connection errors and 5xx/429 responses, with jittered exponential backoff
+  - circuit breakers, one per job (each league sync, the locker room page). After
+    BREAKER_FAILURE_THRESHOLD failed requests of a job in a row its pages are skipped for
+    BREAKER_COOLDOWN_SECONDS, then a single trial request decides whether to resume. One broken
+    league schedule does not stop the other leagues' syncs
+  - latency and breaker stats for the admin sync status endpoint
+'''
+from collections import deque
+import datetime
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from webserver.logging import write_log
+
+MAX_CONNECTIONS = 4
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 30
+RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 5 * 60
+
+# breaker of the requests that do not name one
+DEFAULT_BREAKER = 'site'
+
+# requests whose latency is kept for the percentiles
+LATENCY_WINDOW = 500
+
+class CircuitOpenError(requests.RequestException):
+    ''' Raised instead of making a request while the breaker is open '''
+
+class JitteredRetry(Retry):
+    ''' Retry with the exponential backoff scaled by a random factor in [0.5, 1], so retries of
+        concurrent requests do not hit the site in lockstep. (urllib3 1.26 has no backoff_jitter.)
+    '''
+    def get_backoff_time(self):
+        return super().get_backoff_time() * random.uniform(0.5, 1)
+
+class CircuitBreaker:
+
+    CLOSED = 'closed'        # requests go through
+    OPEN = 'open'            # requests are rejected until the cool down has passed
+    HALF_OPEN = 'half_open'  # one trial request is in flight, the others are rejected
+
+    def __init__(self, name=DEFAULT_BREAKER, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 cooldown_seconds=BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.lock = threading.Lock()
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        ''' Whether a request may be made now '''
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                write_log('INFO', f'Circuit breaker {self.name} closed, the site is responding again')
+
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    write_log('ERROR', f'Circuit breaker {self.name} open after {self.consecutive_failures} failed requests, '
+                                       f'skipping its pages for {self.cooldown_seconds}s')
+                    self.times_opened += 1
+
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def status(self):
+        with self.lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(self.cooldown_seconds - (time.monotonic() - self.opened_at), 0)
+
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected_requests': self.rejected,
+                'retry_in_seconds': round(retry_in, 1) if retry_in is not None else None
+            }
+
+class HttpClient:
+    ''' Has the get(url, headers, timeout) of requests.Session that the synchronizer and the
+        sync_fixtures transports use. session replaces the pooled session, e.g. with a replay
+        transport, which keeps the breakers and stats in the loop.
+
+        Each request names the breaker it counts towards, created on first use. breaker_factory
+        makes a CircuitBreaker from its name.
+    '''
+    def __init__(self, session=None, max_connections=MAX_CONNECTIONS,
+                 connect_timeout_seconds=CONNECT_TIMEOUT_SECONDS, read_timeout_seconds=READ_TIMEOUT_SECONDS,
+                 retries=RETRIES, retry_backoff_seconds=RETRY_BACKOFF_SECONDS, breaker_factory=CircuitBreaker):
+        self.timeout = (connect_timeout_seconds, read_timeout_seconds)
+        self.breaker_factory = breaker_factory
+        self.breakers = {}
+
+        self.session = session
+        if self.session is None:
+            retry = JitteredRetry(total=retries,
+                                  backoff_factor=retry_backoff_seconds,
+                                  status_forcelist=RETRY_STATUSES,
+                                  allowed_methods=['GET'])
+            adapter = HTTPAdapter(pool_connections=1,
+                                  pool_maxsize=max_connections,
+                                  pool_block=True,
+                                  max_retries=retry)
+            self.session = requests.Session()
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.bytes = 0
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.last_failure = None
+
+    def breaker(self, name):
+        ''' The breaker called name, e.g. a league id, created closed on first use '''
+        with self.lock:
+            if name not in self.breakers:
+                self.breakers[name] = self.breaker_factory(name)
+
+            return self.breakers[name]
+
+    def get(self, url, headers=None, timeout=None, breaker=DEFAULT_BREAKER):
+        ''' GETs url, with the client's timeouts unless timeout is given. Raises CircuitOpenError
+            without making the request while the breaker named breaker is open.
+        '''
+        circuit_breaker = self.breaker(breaker)
+        if not circuit_breaker.allow():
+            raise CircuitOpenError(f'Circuit breaker {breaker} is open, skipping {url}')
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=timeout if timeout else self.timeout)
+        except Exception as e:
+            self.record(url, start, None, e, circuit_breaker)
+            raise
+
+        self.record(url, start, response, None, circuit_breaker)
+        return response
+
+    def record(self, url, start, response, error, circuit_breaker):
+        # errors of the site count towards the breaker, client errors like a 404 do not
+        failed = error is not None or response.status_code >= 500
+
+        if failed:
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+
+        with self.lock:
+            self.requests += 1
+            self.latencies_ms.append((time.perf_counter() - start) * 1000)
+
+            if response is not None:
+                self.bytes += len(response.content)
+
+            if failed:
+                self.failures += 1
+                self.last_failure = {
+                    'url': url,
+                    'error': str(error) if error is not None else f'status {response.status_code}',
+                    'at': datetime.datetime.now(datetime.timezone.utc).isoformat()
+                }
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies_ms)
+            breakers = dict(self.breakers)
+            stats = {
+                'requests': self.requests,
+                'failures': self.failures,
+                'bytes': self.bytes,
+                'last_failure': self.last_failure
+            }
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)], 1)
+
+        stats['latency_ms'] = {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1),
+                               'window': len(latencies)}
+        stats['breakers'] = {str(name): breaker.status() for name, breaker in breakers.items()}
+        return stats
@@ -0,0 +1,125 @@
+'''
+leader
+
+Leader election between the webserver processes, so the background jobs (league syncs, locker
+room polling, notifications) run in exactly one of them however many workers are started.
+
+The leader holds a session level Postgres advisory lock on a connection it keeps open. The lock
+is released by Postgres when the leader's process or connection dies, and the next follower to
+check takes over. Local runs against a database without advisory locks (sqlite stand-ins) use an
+exclusive lock on LEADER_LOCK_FILE instead, which the OS releases when the process exits.
+'''
+import fcntl
+import os
+import threading
+
+from sqlalchemy import text
+
+from webserver.database.hockey_db import get_engine
+from webserver.logging import write_log
+
+# arbitrary, but must be the same in every process and not used by any other advisory lock
+SCHEDULER_ADVISORY_LOCK_ID = 4711903526
+LEADER_LOCK_FILE = os.getenv('HOCKEY_REPLY_LEADER_LOCK_FILE', '/tmp/hockey-reply-scheduler.lock')
+
+class LeaderElection:
+
+    def __init__(self, engine=None, lock_file=LEADER_LOCK_FILE):
+        self.engine = engine
+        self.lock_file = lock_file
+        self.lock = threading.Lock()
+
+        self.is_leader = False
+        self.method = None
+        self.connection = None   # holds the advisory lock while leader
+        self.file = None         # holds the file lock while leader
+
+    def uses_advisory_lock(self):
+        if self.engine is None:
+            self.engine = get_engine()
+
+        return self.engine.dialect.name == 'postgresql'
+
+    def check(self):
+        ''' Confirms a leader still holds its lock, or tries to take the lock as a follower.
+            Returns whether this process is the leader.
+        '''
+        with self.lock:
+            try:
+                if self.uses_advisory_lock():
+                    self.method = 'postgres advisory lock'
+                    self.is_leader = self.check_advisory_lock()
+                else:
+                    self.method = f'file lock {self.lock_file}'
+                    self.is_leader = self.check_file_lock()
+
+            except Exception as e:
+                write_log('ERROR', f'Leader election check failed: {e}')
+                self.release_locks()
+                self.is_leader = False
+
+            return self.is_leader
+
+    def check_advisory_lock(self):
+        if self.connection is not None:
+            # raises if the connection was lost, in which case postgres has released the lock
+            self.connection.execute(text('SELECT 1'))
+            return True
+
+        # autocommit, so the held connection does not sit idle in a transaction
+        connection = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        acquired = connection.execute(text('SELECT pg_try_advisory_lock(:lock_id)'),
+                                      {'lock_id': SCHEDULER_ADVISORY_LOCK_ID}).scalar()
+        if not acquired:
+            connection.close()
+            return False
+
+        self.connection = connection
+        return True
+
+    def check_file_lock(self):
+        if self.file is not None:
+            return True
+
+        lock_file = open(self.lock_file, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+
+        self.file = lock_file
+        return True
+
+    def release(self):
+        ''' Gives up leadership, e.g. on shutdown, so a follower can take over right away '''
+        with self.lock:
+            self.release_locks()
+            self.is_leader = False
+
+    def release_locks(self):
+        if self.connection is not None:
+            try:
+                self.connection.execute(text('SELECT pg_advisory_unlock(:lock_id)'),
+                                        {'lock_id': SCHEDULER_ADVISORY_LOCK_ID})
+            except Exception:
+                pass # a lost connection has already released it
+
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+
+            self.connection = None
+
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+    def status(self):
+        return {
+            'is_leader': self.is_leader,
+            'pid': os.getpid(),
+            'lock': self.method
+        }
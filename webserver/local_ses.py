@@ -0,0 +1,114 @@
+'''
+local_ses
+
+In-process stand-in for the boto3 SES client, for testing and benchmarking the email paths
+offline. It has the calls email.py makes: send_email, create_template and
+send_bulk_templated_email. Templates are rendered with the {{name}} (html escaped) and
+{{{name}}} (raw) subset of the SES template syntax, and every message is kept in sent.
+
+Set HOCKEY_REPLY_LOCAL_SES=1 to use it in place of SES, e.g. when running locally.
+'''
+import html
+import itertools
+import json
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+MAX_BULK_DESTINATIONS = 50
+
+PLACEHOLDER = re.compile(r'\{\{\{\s*(\w+)\s*\}\}\}|\{\{\s*(\w+)\s*\}\}')
+
+def render(part, data):
+    def replace(match):
+        raw_name, escaped_name = match.groups()
+        if raw_name:
+            return str(data.get(raw_name, ''))
+        return html.escape(str(data.get(escaped_name, '')))
+
+    return PLACEHOLDER.sub(replace, part)
+
+def client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+class LocalSES:
+    ''' latency_seconds is added to every call to model the round trip to SES. Messages to the
+        addresses in reject get a MessageRejected status, like a suppressed address.
+    '''
+    def __init__(self, latency_seconds=0, reject=None):
+        self.latency_seconds = latency_seconds
+        self.reject = set(reject if reject else [])
+        self.lock = threading.Lock()
+        self.message_ids = itertools.count(1)
+
+        self.templates = {}
+        self.sent = []
+        self.calls = {'send_email': 0, 'create_template': 0, 'send_bulk_templated_email': 0}
+
+    def call(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def record(self, to_addresses, subject, text, html_body):
+        with self.lock:
+            message_id = f'local-{next(self.message_ids)}'
+            self.sent.append({'message_id': message_id, 'to': list(to_addresses), 'subject': subject,
+                              'text': text, 'html': html_body})
+        return message_id
+
+    def send_email(self, Source, Destination, Message, **kwargs):
+        self.call('send_email')
+
+        to_addresses = Destination['ToAddresses']
+        if self.reject.intersection(to_addresses):
+            raise client_error('MessageRejected', f'Address rejected: {to_addresses}', 'SendEmail')
+
+        message_id = self.record(to_addresses, Message['Subject']['Data'], Message['Body']['Text']['Data'],
+                                 Message['Body']['Html']['Data'])
+        return {'MessageId': message_id}
+
+    def create_template(self, Template):
+        self.call('create_template')
+
+        with self.lock:
+            if Template['TemplateName'] in self.templates:
+                raise client_error('AlreadyExists', f'Template {Template["TemplateName"]} already exists',
+                                   'CreateTemplate')
+            self.templates[Template['TemplateName']] = dict(Template)
+
+        return {}
+
+    def send_bulk_templated_email(self, Source, Template, DefaultTemplateData, Destinations, **kwargs):
+        self.call('send_bulk_templated_email')
+
+        if len(Destinations) > MAX_BULK_DESTINATIONS:
+            raise client_error('InvalidParameterValue', f'{len(Destinations)} destinations, at most '
+                               f'{MAX_BULK_DESTINATIONS} are allowed', 'SendBulkTemplatedEmail')
+
+        template = self.templates.get(Template)
+        if template is None:
+            raise client_error('TemplateDoesNotExist', f'Template {Template} does not exist', 'SendBulkTemplatedEmail')
+
+        default_data = json.loads(DefaultTemplateData)
+        statuses = []
+
+        for destination in Destinations:
+            to_addresses = destination['Destination']['ToAddresses']
+
+            if self.reject.intersection(to_addresses):
+                statuses.append({'Status': 'MessageRejected', 'Error': f'Address rejected: {to_addresses}'})
+                continue
+
+            data = dict(default_data, **json.loads(destination.get('ReplacementTemplateData', '{}')))
+            message_id = self.record(to_addresses,
+                                     render(template['SubjectPart'], data),
+                                     render(template['TextPart'], data),
+                                     render(template['HtmlPart'], data))
+            statuses.append({'Status': 'Success', 'MessageId': message_id})
+
+        return {'Status': statuses}
@@ -0,0 +1,98 @@
+'''
+rate_limiter
+
+Token bucket for pacing calls to a rate limited service. email.py shares one across every email
+send of the process to stay under the SES maximum send rate.
+
+A caller reserves its tokens and sleeps only for the short time until they have refilled. If
+that would take longer than its max_wait_seconds it gets nothing and is expected to requeue the
+work rather than block its thread.
+'''
+from collections import deque
+import threading
+import time
+
+# waits kept for the percentiles
+WAIT_WINDOW = 500
+
+class TokenBucket:
+    ''' Refills at rate_per_second up to capacity tokens. clock and sleep are replaceable for tests. '''
+
+    def __init__(self, rate_per_second, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+
+        self.tokens = capacity
+        self.updated_at = clock()
+
+        self.acquired = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.waiting = 0
+        self.waits_ms = deque(maxlen=WAIT_WINDOW)
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1, max_wait_seconds=0):
+        ''' Takes tokens, waiting up to max_wait_seconds for them to refill. Returns whether they
+            were taken. More tokens than the capacity are never granted.
+        '''
+        with self.lock:
+            self.refill(self.clock())
+
+            wait = max(tokens - self.tokens, 0) / self.rate
+            if tokens > self.capacity or wait > max_wait_seconds:
+                self.rejected += 1
+                return False
+
+            # the tokens are reserved now, the bucket goes negative until they have refilled
+            self.tokens -= tokens
+            self.acquired += 1
+            self.waits_ms.append(wait * 1000)
+            self.waiting += 1 if wait else 0
+
+        if wait:
+            try:
+                self.sleep(wait)
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+
+        return True
+
+    def throttle(self):
+        ''' The service throttled a call anyway, e.g. because other processes share its rate.
+            Empties the bucket so the next calls back off.
+        '''
+        with self.lock:
+            self.refill(self.clock())
+            self.tokens = min(self.tokens, 0)
+            self.throttled += 1
+
+    def stats(self):
+        with self.lock:
+            self.refill(self.clock())
+            waits = sorted(self.waits_ms)
+            stats = {
+                'rate_per_second': self.rate,
+                'capacity': self.capacity,
+                'tokens': round(self.tokens, 2),
+                'acquired': self.acquired,
+                'rejected': self.rejected,
+                'throttled': self.throttled,
+                'waiting': self.waiting
+            }
+
+        def percentile(fraction):
+            if not waits:
+                return None
+            return round(waits[min(int(len(waits) * fraction), len(waits) - 1)], 1)
+
+        stats['wait_ms'] = {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1),
+                            'window': len(waits)}
+        return stats
@@ -0,0 +1,174 @@
+'''
+sync_fixtures
+
+Record and replay of the Sharks Ice pages fetched by a Synchronizer, so whole league syncs can be
+run and benchmarked without the network.
+
+A fixture directory holds one file per page plus index.json, which maps each url to its file and
+the metadata of the request that fetched it (status, response headers, request headers, time).
+Both transports have the subset of the requests.Session interface the Synchronizer uses: get(url,
+headers, timeout) returning a response with status_code, content, headers and raise_for_status().
+
+To record the pages of a full sync and locker room check:
+    python -m webserver.sync_fixtures <fixture dir> [database url]
+The database url defaults to a new sqlite file in the fixture directory, so nothing is written to
+production. Benchmark against a recording with webserver.test.benchmark_sync.
+'''
+import datetime
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+INDEX_FILE = 'index.json'
+RECORDED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+def page_filename(url):
+    return f'{hashlib.sha1(url.encode()).hexdigest()}.html'
+
+def load_index(fixture_dir):
+    with open(os.path.join(fixture_dir, INDEX_FILE), 'r') as f:
+        return json.load(f)
+
+class LocalLogger:
+    ''' Stands in for the Cloud Logging logger, which needs Google credentials. write_log already
+        prints every message.
+    '''
+    def log_text(self, text):
+        pass
+
+def use_local_logger():
+    ''' Keeps the logs of an offline sync off Google Cloud Logging '''
+    from webserver import logging
+    logging.global_logger = LocalLogger()
+
+class RecordingTransport:
+    ''' Fetches with a requests session and saves every page to the fixture directory '''
+
+    def __init__(self, fixture_dir, session=None):
+        self.fixture_dir = fixture_dir
+        self.session = session if session else requests.Session()
+        self.lock = threading.Lock()
+
+        os.makedirs(fixture_dir, exist_ok=True)
+
+        self.index = {}
+        if os.path.exists(os.path.join(fixture_dir, INDEX_FILE)):
+            self.index = load_index(fixture_dir)
+
+    def get(self, url, headers=None, timeout=None):
+        start = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=timeout)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # a 304 has no page to save, the last recorded copy is kept
+        if response.status_code == 304 and url in self.index:
+            return response
+
+        entry = {
+            'file': page_filename(url),
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            'request_headers': dict(headers) if headers else {},
+            'elapsed_ms': round(elapsed_ms, 1),
+            'fetched_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
+        }
+
+        with self.lock:
+            with open(os.path.join(self.fixture_dir, entry['file']), 'wb') as f:
+                f.write(response.content)
+
+            self.index[url] = entry
+            with open(os.path.join(self.fixture_dir, INDEX_FILE), 'w') as f:
+                json.dump(self.index, f, indent=2, sort_keys=True)
+
+        return response
+
+class ReplayResponse:
+
+    def __init__(self, url, status_code, content=b'', headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers if headers else {})
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} replaying {self.url}', response=self)
+
+class ReplayTransport:
+    ''' Serves the pages of a fixture directory. Conditional requests matching the recorded ETag
+        get a 304, like the live site. latency_seconds is added to every request to model the
+        round trip to the site.
+    '''
+    def __init__(self, fixture_dir, latency_seconds=0):
+        self.fixture_dir = fixture_dir
+        self.latency_seconds = latency_seconds
+        self.index = load_index(fixture_dir)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def get(self, url, headers=None, timeout=None):
+        # called from the Synchronizer's fetch threads
+        with self.lock:
+            self.requests += 1
+
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        entry = self.index.get(url)
+        if entry is None:
+            return ReplayResponse(url, 404)
+
+        headers = headers if headers else {}
+        etag = entry['headers'].get('ETag')
+        if etag and headers.get('If-None-Match') == etag:
+            return ReplayResponse(url, 304, headers=entry['headers'])
+
+        with open(os.path.join(self.fixture_dir, entry['file']), 'rb') as f:
+            content = f.read()
+
+        return ReplayResponse(url, entry['status'], content, entry['headers'])
+
+def create_schema(engine):
+    ''' Creates the tables in a stand-in database. Postgres gets the real migrations, sqlite
+        (which can not run them) gets the tables from the models.
+    '''
+    if engine.dialect.name == 'sqlite':
+        from webserver.database.alchemy_models import Base
+        Base.metadata.create_all(engine)
+    else:
+        from webserver.database.migrate import migrate
+        migrate(engine)
+
+def record(fixture_dir, database_url=None):
+    ''' Runs a full sync and locker room check against the live site, recording every page '''
+    from webserver.data_synchronizer import Synchronizer
+    from webserver.database import hockey_db
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    hockey_db.DATABASE_URL = database_url if database_url else \
+                             f'sqlite:///{os.path.abspath(os.path.join(fixture_dir, "record.db"))}'
+    create_schema(hockey_db.get_engine())
+    use_local_logger()
+
+    synchronizer = Synchronizer(notify_changes=False)
+    recorder = RecordingTransport(fixture_dir, synchronizer.http.session)
+    synchronizer.http.session = recorder
+
+    synchronizer.sync()
+    synchronizer.locker_room_assignment_check()
+
+    print(f'Recorded {len(recorder.index)} pages to {fixture_dir}')
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python -m webserver.sync_fixtures <fixture dir> [database url]')
+        sys.exit(1)
+
+    record(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,134 @@
+'''
+sync_metrics
+
+Timings and counts of the synchronizer's league syncs, kept in a rolling in-process history for
+the admin sync metrics endpoint. Each run records the latency, status and size of every page
+fetch, the parse time of every page, the time spent in each stage of the pipeline and the number
+of games inserted, updated, rescheduled and deleted.
+'''
+from collections import deque
+from contextlib import contextmanager
+import datetime
+import threading
+import time
+
+# stages of a league sync, in pipeline order
+STAGES = ['season_page', 'fetch_team_pages', 'parse', 'apply_games', 'apply_stats', 'notify',
+          'page_states', 'deleted_games']
+
+SLOWEST_FETCHES = 5
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+class SyncMetrics:
+    ''' Metrics of one league sync run. Fetches are recorded from the fetch threads, the rest from
+        the thread running the sync.
+    '''
+    def __init__(self, league_id):
+        self.league_id = league_id
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+        self.result = None
+        self.seconds = None
+        self.stages = {stage: 0.0 for stage in STAGES}
+        self.fetches = []
+        self.parses = []
+        self.games = {'inserted': 0, 'updated': 0, 'rescheduled': 0, 'deleted': 0}
+        self.pages = {}
+        self.parsed_games = {}
+
+    @contextmanager
+    def stage(self, name):
+        ''' Adds the time spent in the block to the stage '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def record_fetch(self, url, status, seconds, size):
+        with self.lock:
+            self.fetches.append({'url': url, 'status': status, 'ms': round(seconds * 1000, 1), 'bytes': size})
+
+    def record_parse(self, url, seconds):
+        self.parses.append({'url': url, 'ms': round(seconds * 1000, 1)})
+
+    def finish(self, success, page_counts, game_counts):
+        self.result = 'success' if success else 'failed'
+        self.seconds = time.perf_counter() - self.start
+        self.pages = dict(page_counts)
+        self.parsed_games = dict(game_counts)
+
+    def summary(self, include_fetches=False):
+        with self.lock:
+            fetches = list(self.fetches)
+
+        fetch_ms = sorted(fetch['ms'] for fetch in fetches)
+        parse_ms = sorted(parse['ms'] for parse in self.parses)
+
+        summary = {
+            'league_id': self.league_id,
+            'started_at': self.started_at.isoformat(),
+            'result': self.result,
+            'ms': round(self.seconds * 1000, 1) if self.seconds is not None else None,
+            'stages_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+            'fetch': {
+                'count': len(fetches),
+                'errors': len([fetch for fetch in fetches if fetch['status'] == 'error']),
+                'bytes': sum(fetch['bytes'] for fetch in fetches),
+                'p50_ms': percentile(fetch_ms, 0.5),
+                'p95_ms': percentile(fetch_ms, 0.95),
+                'max_ms': fetch_ms[-1] if fetch_ms else None,
+                'slowest': sorted(fetches, key=lambda fetch: fetch['ms'], reverse=True)[:SLOWEST_FETCHES]
+            },
+            'parse': {
+                'count': len(parse_ms),
+                'total_ms': round(sum(parse_ms), 1),
+                'max_ms': parse_ms[-1] if parse_ms else None
+            },
+            'pages': self.pages,
+            'games': dict(self.games, **self.parsed_games)
+        }
+
+        if include_fetches:
+            summary['fetch']['all'] = fetches
+            summary['parse']['all'] = list(self.parses)
+
+        return summary
+
+class SyncMetricsHistory:
+    ''' The metrics of the last max_runs sync runs of all leagues, oldest first '''
+
+    def __init__(self, max_runs):
+        self.runs = deque(maxlen=max_runs)
+        self.lock = threading.Lock()
+
+    def add(self, metrics):
+        with self.lock:
+            self.runs.append(metrics)
+
+    def report(self, league_id=None, include_fetches=False):
+        ''' The summary of each run plus the mean time of each stage over them, to spot a stage
+            that has become slower
+        '''
+        with self.lock:
+            runs = [metrics for metrics in self.runs if league_id is None or metrics.league_id == league_id]
+
+        summaries = [metrics.summary(include_fetches) for metrics in runs]
+
+        mean_stages_ms = {}
+        if summaries:
+            for stage in STAGES + ['total']:
+                values = [summary['ms'] if stage == 'total' else summary['stages_ms'][stage] for summary in summaries]
+                mean_stages_ms[stage] = round(sum(values) / len(values), 1)
+
+        return {
+            'runs': summaries,
+            'mean_ms': mean_stages_ms
+        }
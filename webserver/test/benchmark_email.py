@@ -0,0 +1,57 @@
+'''
+benchmark_email
+
+Measures sending one team-wide email (game time changed) to a roster, one send_email per player
+against send_bulk_email, with the local SES stand-in adding a round trip latency to every call.
+
+To run: python -m webserver.test.benchmark_email [recipients] [latency ms]
+'''
+import sys
+import time
+from unittest import mock
+
+from webserver import email
+from webserver.email import EmailTemplate, send_bulk_email, send_email
+from webserver.local_ses import LocalSES
+from webserver.rate_limiter import TokenBucket
+
+GAME_DATA = {
+    'game_id': 1,
+    'user_team_id': 2,
+    'team': 'Benchmark',
+    'vs': 'Benchmark 2',
+    'scheduled_at': 'Sat, Mar 02 @ 09:15 PM',
+    'old_scheduled_at': 'Fri, Mar 01 @ 10:30 PM'
+}
+
+def per_recipient(recipients):
+    for address, data in recipients:
+        send_email(EmailTemplate.GAME_TIME_CHANGED, dict(GAME_DATA, **data), address)
+
+def bulk(recipients):
+    send_bulk_email(EmailTemplate.GAME_TIME_CHANGED, GAME_DATA, recipients)
+
+def benchmark(name, send, recipients, latency_seconds):
+    email.client = LocalSES(latency_seconds=latency_seconds)
+    email.ses_templates_created.clear()
+
+    # the send rate would dominate, measure the calls only
+    email.send_rate_limiter = TokenBucket(1000, email.SES_BULK_MAX_DESTINATIONS)
+
+    start = time.perf_counter()
+    send(recipients)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    calls = sum(email.client.calls.values())
+    print(f'{name:<15} {elapsed_ms:9.1f} ms  {calls:4} SES calls  {len(email.client.sent):4} sent')
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency_seconds = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+
+    recipients = [(f'player{i}@example.com', {'name': f'Player {i}', 'user_id': i}) for i in range(count)]
+
+    print(f'{count} recipients, {latency_seconds * 1000:.0f} ms per SES call')
+    with mock.patch('webserver.email.write_log'):
+        benchmark('per recipient', per_recipient, recipients, latency_seconds)
+        benchmark('bulk', bulk, recipients, latency_seconds)
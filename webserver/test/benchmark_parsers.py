@@ -0,0 +1,78 @@
+'''
+benchmark_parsers
+
+Measures the time and peak memory of parsing the saved Sharks Ice pages (team.html and
+season.html) with the html.parser full page tree the parsers used to build, against each table
+only backend from website_parsers.make_soup.
+
+To run: python -m webserver.test.benchmark_parsers [iterations]
+'''
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+from webserver.website_parsers import HTML_PARSER_BACKENDS, TeamPageParser, make_soup
+
+TEST_DIR = os.path.dirname(__file__)
+TEAM_PAGE_URL = 'https://stats.sharksice.timetoscore.com/display-schedule?team=1&season=60'
+
+def parse_team_page(soup):
+    team_parser = TeamPageParser(TEAM_PAGE_URL, soup)
+    team_parser.parse()
+    return team_parser
+
+def team_page_full_tree(html):
+    return parse_team_page(BeautifulSoup(html, 'html.parser'))
+
+def season_page_full_tree(html):
+    return BeautifulSoup(html, 'html.parser').find_all('a')
+
+def team_page_backend(backend):
+    return lambda html: parse_team_page(make_soup(html, 'table', backend))
+
+def season_page_backend(backend):
+    # the synchronizer only reads the team links from the season page
+    return lambda html: make_soup(html, 'a', backend).find_all('a')
+
+def measure(parse, html, iterations):
+    ''' Returns (milliseconds per parse, peak KiB allocated during one parse) '''
+    start = time.perf_counter()
+    for i in range(iterations):
+        parse(html)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    tracemalloc.start()
+    parse(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed_ms, peak / 1024
+
+def benchmark(name, html, baseline, candidates, iterations):
+    base_ms, base_kib = measure(baseline, html, iterations)
+
+    print(f'{name} ({len(html)} bytes, {iterations} iterations)')
+    print(f'  {"html.parser, full page":28} {base_ms:8.2f} ms {base_kib:10.0f} KiB')
+
+    for label, parse in candidates:
+        ms, kib = measure(parse, html, iterations)
+        print(f'  {label:28} {ms:8.2f} ms {kib:10.0f} KiB   '
+              f'{base_ms / ms:4.1f}x faster, {100 * (1 - kib / base_kib):3.0f}% less memory')
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    backends = [backend for backend in HTML_PARSER_BACKENDS if builder_registry.lookup(backend)]
+
+    with open(os.path.join(TEST_DIR, 'team.html'), 'r') as f:
+        team_html = f.read()
+    with open(os.path.join(TEST_DIR, 'season.html'), 'r') as f:
+        season_html = f.read()
+
+    benchmark('team.html', team_html, team_page_full_tree,
+              [(f'{backend}, tables only', team_page_backend(backend)) for backend in backends], iterations)
+    benchmark('season.html', season_html, season_page_full_tree,
+              [(f'{backend}, links only', season_page_backend(backend)) for backend in backends], iterations)
@@ -0,0 +1,68 @@
+'''
+sqlite_db
+
+Base test case for the tests that run Database methods and synchronizer jobs against a new sqlite
+file, so they need neither the production postgres nor Google credentials. The schema is created
+from the models, like the sync benchmarks do (see sync_fixtures.create_schema).
+'''
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+
+from webserver import logging
+from webserver.database import hockey_db
+from webserver.database.hockey_db import Database, team_cache, user_cache
+from webserver.sync_fixtures import INDEX_FILE, LocalLogger, create_schema, page_filename
+
+class SqliteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.original_engine = hockey_db.global_engine
+        self.original_logger = logging.global_logger
+
+        # every Database instance, including the ones the synchronizer jobs create, uses this engine
+        hockey_db.global_engine = create_engine(f'sqlite:///{os.path.join(self.directory, "test.db")}',
+                                                connect_args={'timeout': 30})
+        create_schema(hockey_db.global_engine)
+        logging.global_logger = LocalLogger()
+
+        team_cache.clear()
+        user_cache.clear()
+
+        self.db = Database()
+
+    def tearDown(self):
+        self.db.close()
+        hockey_db.global_engine.dispose()
+
+        hockey_db.global_engine = self.original_engine
+        logging.global_logger = self.original_logger
+
+        team_cache.clear()
+        user_cache.clear()
+        shutil.rmtree(self.directory)
+
+    def write_fixture(self, pages):
+        ''' Writes url -> html pages as a sync_fixtures fixture directory, for a ReplayTransport.
+            Returns the directory.
+        '''
+        fixture_dir = os.path.join(self.directory, 'fixture')
+        os.makedirs(fixture_dir, exist_ok=True)
+
+        index = {}
+        for url, html in pages.items():
+            with open(os.path.join(fixture_dir, page_filename(url)), 'w') as f:
+                f.write(html)
+
+            index[url] = {'file': page_filename(url), 'status': 200, 'headers': {}}
+
+        with open(os.path.join(fixture_dir, INDEX_FILE), 'w') as f:
+            json.dump(index, f)
+
+        return fixture_dir
@@ -10,6 +10,8 @@ import datetime
 import json
 import unittest
 
+from sqlalchemy import event
+
 from webserver import create_app
 from webserver.database.hockey_db import get_db, setup_test_db
 from webserver.database.alchemy_models import Game, TeamPlayer, User
@@ -132,6 +134,26 @@ class BasicTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         print(response.get_data())
 
+    def test_get_games_query_count(self):
+        ''' The games feed is built from set based queries, so the number of queries must not
+            grow with the number of games, teams, or replies.
+        '''
+        MAX_GAMES_FEED_QUERIES = 4
+        statements = []
+
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = get_db().engine
+        event.listen(engine, 'before_cursor_execute', count_query)
+        try:
+            response = self.client.get(f'/api/games/{self.team_id}', content_type='application/json')
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_query)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(statements), MAX_GAMES_FEED_QUERIES, statements)
+
     def test_get_single_game(self):
         response = self.client.get(f'/api/game/{self.GAME_TEST_ID}/for-team/{self.team_id}', content_type='application/json')
         self.assertEqual(response.status_code, 200)
@@ -0,0 +1,212 @@
+'''
+test_email
+
+Checks that every email template compiles and renders, that missing data is caught before
+sending, the batching of bulk sends against the local SES stand-in and the send rate limiter.
+
+To run: python -m unittest webserver.test.test_email
+'''
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from webserver import email
+from webserver.email import EmailTemplate, EmailThrottled, TemplateRegistry, send_bulk_email, send_email
+from webserver.local_ses import LocalSES
+from webserver.rate_limiter import TokenBucket
+
+class EmailTemplatesTestCase(unittest.TestCase):
+
+    def test_templates_render(self):
+        registry = TemplateRegistry(reload=False)
+        registry.load_all()
+
+        for template in EmailTemplate:
+            compiled = registry.get(template)
+            data = {name: f'<{name}>' for name in compiled.placeholders}
+
+            subject, text, html = compiled.render(data)
+            self.assertNotIn('$', subject + text, template.name)
+
+            for name in compiled.placeholders:
+                self.assertIn(f'<{name}>', subject + text + html, template.name)
+
+    def test_missing_data(self):
+        compiled = TemplateRegistry(reload=False).get(EmailTemplate.GAMES_CANCELLED)
+        data = {name: '' for name in compiled.placeholders}
+        del data['team']
+
+        self.assertEqual(compiled.missing_keys(data), {'team'})
+        with self.assertRaises(KeyError):
+            compiled.render(data)
+
+    def test_reload(self):
+        template_dir = tempfile.mkdtemp()
+        original_dir = email.TEMPLATE_DIR
+        try:
+            for name in os.listdir(original_dir):
+                shutil.copy(os.path.join(original_dir, name), template_dir)
+            email.TEMPLATE_DIR = template_dir
+
+            registry = TemplateRegistry(reload=True)
+            compiled = registry.get(EmailTemplate.FORGOT_PASSWORD)
+            self.assertIs(registry.get(EmailTemplate.FORGOT_PASSWORD), compiled)
+
+            subject_path = compiled.paths['subj']
+            with open(subject_path, 'w') as f:
+                f.write('Reset your password ${token}')
+            os.utime(subject_path, (compiled.mtimes['subj'] + 10, compiled.mtimes['subj'] + 10))
+
+            reloaded = registry.get(EmailTemplate.FORGOT_PASSWORD)
+            self.assertIsNot(reloaded, compiled)
+            self.assertEqual(reloaded.render({'token': 'abc'})[0], 'Reset your password abc')
+        finally:
+            email.TEMPLATE_DIR = original_dir
+            shutil.rmtree(template_dir)
+
+class BulkEmailTestCase(unittest.TestCase):
+
+    GAME_DATA = {
+        'game_id': 1,
+        'user_team_id': 2,
+        'team': 'Unit Test',
+        'vs': 'Unit Test 2',
+        'scheduled_at': 'Sat, Mar 02 @ 09:15 PM',
+        'old_scheduled_at': 'Fri, Mar 01 @ 10:30 PM'
+    }
+
+    def setUp(self):
+        self.original_client = email.client
+        self.original_limiter = email.send_rate_limiter
+        email.client = LocalSES(reject=['player7@example.com'])
+        email.send_rate_limiter = TokenBucket(1000, 50)
+        email.ses_templates_created.clear()
+
+        # failed sends are logged, keep the test offline
+        self.write_log = mock.patch('webserver.email.write_log')
+        self.write_log.start()
+
+    def tearDown(self):
+        email.client = self.original_client
+        email.send_rate_limiter = self.original_limiter
+        email.ses_templates_created.clear()
+        self.write_log.stop()
+
+    def recipients(self, count):
+        return [(f'player{i}@example.com', {'name': f'Player {i}', 'user_id': i}) for i in range(count)]
+
+    def test_batches(self):
+        failed, throttled = send_bulk_email(EmailTemplate.GAME_TIME_CHANGED, self.GAME_DATA, self.recipients(120))
+
+        self.assertEqual(throttled, [])
+        self.assertEqual(email.client.calls['send_bulk_templated_email'], 3)
+        self.assertEqual(email.client.calls['create_template'], 1)
+        self.assertEqual(failed, ['player7@example.com'])
+        self.assertEqual(len(email.client.sent), 119)
+
+        # the SES template renders the same email as a regular send
+        compiled = email.templates.get(EmailTemplate.GAME_TIME_CHANGED)
+        subject, text, html = compiled.render(dict(self.GAME_DATA, name='Player 3', user_id=3))
+        sent = next(message for message in email.client.sent if message['to'] == ['player3@example.com'])
+        self.assertEqual((sent['subject'], sent['text'], sent['html']), (subject, text, html))
+
+        # the template is created once per process
+        send_bulk_email(EmailTemplate.GAME_TIME_CHANGED, self.GAME_DATA, self.recipients(1))
+        self.assertEqual(email.client.calls['create_template'], 1)
+
+    def test_missing_data(self):
+        recipients = self.recipients(2)
+        del recipients[1][1]['name']
+
+        failed, _ = send_bulk_email(EmailTemplate.GAME_TIME_CHANGED, self.GAME_DATA, recipients)
+
+        self.assertEqual(failed, ['player1@example.com'])
+        self.assertEqual([message['to'] for message in email.client.sent], [['player0@example.com']])
+
+    def test_throttled(self):
+        # chunks fit the bucket. With the clock stopped the third chunk waits the full
+        # SEND_RATE_MAX_WAIT_SECONDS, the fourth would wait longer and is handed back to be queued.
+        email.send_rate_limiter = TokenBucket(10, 10, clock=lambda: 0, sleep=lambda seconds: None)
+        recipients = self.recipients(35)
+
+        failed, throttled = send_bulk_email(EmailTemplate.GAME_TIME_CHANGED, self.GAME_DATA, recipients)
+
+        self.assertEqual(failed, ['player7@example.com'])
+        self.assertEqual(email.client.calls['send_bulk_templated_email'], 3)
+        self.assertEqual(throttled, recipients[30:])
+
+    def test_more_recipients_than_capacity(self):
+        slept = []
+        email.send_rate_limiter = TokenBucket(10, 10, clock=lambda: 0, sleep=slept.append)
+        to_emails = [f'captain{i}@example.com' for i in range(25)]
+
+        # one email, its tokens taken in parts of at most the capacity
+        self.assertTrue(send_email(EmailTemplate.GAME_TIME_CHANGED, dict(self.GAME_DATA, name='Team', user_id=0), to_emails))
+        self.assertEqual(email.client.calls['send_email'], 1)
+        self.assertEqual(slept, [1.0, 1.5])
+
+        # the first part is throttled like any other send, and reserves nothing
+        with self.assertRaises(EmailThrottled):
+            send_email(EmailTemplate.GAME_TIME_CHANGED, dict(self.GAME_DATA, name='Team', user_id=0), to_emails)
+        self.assertEqual(email.send_rate_limiter.stats()['tokens'], -15)
+
+    def test_no_wait(self):
+        slept = []
+        email.send_rate_limiter = TokenBucket(10, 10, clock=lambda: 0, sleep=slept.append)
+        data = dict(self.GAME_DATA, name='Team', user_id=0)
+
+        # a send that may not wait is throttled as soon as the bucket is short of tokens, and an
+        # email to more recipients than the capacity always is
+        self.assertTrue(send_email(EmailTemplate.GAME_TIME_CHANGED, data, 'captain0@example.com', max_wait_seconds=0))
+        with self.assertRaises(EmailThrottled):
+            send_email(EmailTemplate.GAME_TIME_CHANGED, data, [f'captain{i}@example.com' for i in range(11)],
+                       max_wait_seconds=0)
+        self.assertEqual(email.send_rate_limiter.stats()['tokens'], 9)
+
+        email.send_rate_limiter.acquire(9)
+        with self.assertRaises(EmailThrottled):
+            send_email(EmailTemplate.GAME_TIME_CHANGED, data, 'captain1@example.com', max_wait_seconds=0)
+
+        self.assertEqual(slept, [])
+        self.assertEqual(email.client.calls['send_email'], 1)
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.slept = []
+        self.bucket = TokenBucket(10, 10, clock=lambda: self.now, sleep=self.slept.append)
+
+    def test_burst_then_wait(self):
+        self.assertTrue(self.bucket.acquire(10))
+        self.assertEqual(self.slept, [])
+
+        # the next 5 tokens refill in half a second
+        self.assertTrue(self.bucket.acquire(5, max_wait_seconds=1))
+        self.assertEqual(self.slept, [0.5])
+
+        # they are reserved, so the next caller waits behind them
+        self.assertFalse(self.bucket.acquire(10, max_wait_seconds=1))
+
+        self.now = 1.5
+        self.assertTrue(self.bucket.acquire(10))
+
+        stats = self.bucket.stats()
+        self.assertEqual((stats['acquired'], stats['rejected']), (3, 1))
+        self.assertEqual(stats['wait_ms']['max'], 500)
+
+    def test_over_capacity(self):
+        self.assertFalse(self.bucket.acquire(11, max_wait_seconds=60))
+
+    def test_throttle(self):
+        self.bucket.throttle()
+        self.assertFalse(self.bucket.acquire(1))
+
+        self.now = 0.1
+        self.assertTrue(self.bucket.acquire(1))
+        self.assertEqual(self.bucket.stats()['throttled'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
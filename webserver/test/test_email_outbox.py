@@ -0,0 +1,199 @@
+'''
+test_email_outbox
+
+Runs the outbox against a sqlite db and the local SES stand-in: the claim leases, recording the
+send results, and the emails to the same people going out in the order they were queued. Also
+checks which emails the team API handlers queue.
+
+To run: python -m unittest webserver.test.test_email_outbox
+'''
+import datetime
+import json
+import unittest
+from unittest import mock
+
+from sqlalchemy import update
+
+from webserver import create_app, email
+from webserver.database import hockey_db
+from webserver.database.alchemy_models import EmailOutbox, User
+from webserver.email import EmailTemplate, queue_email, send_forgot_password, send_player_join_request
+from webserver.email_outbox import OutboxWorker
+from webserver.local_ses import LocalSES
+from webserver.rate_limiter import TokenBucket
+from webserver.test.sqlite_db import SqliteTestCase
+
+class EmailOutboxTestCase(SqliteTestCase):
+
+    TEMPLATE = EmailTemplate.REPLY_CHANGED
+
+    def setUp(self):
+        super().setUp()
+
+        self.original_client = email.client
+        self.original_limiter = email.send_rate_limiter
+        email.client = LocalSES(reject=['rejected@example.com'])
+        email.send_rate_limiter = TokenBucket(1000, 50)
+
+        # failed sends are logged, keep the test offline
+        self.write_log = mock.patch('webserver.email.write_log')
+        self.write_log.start()
+
+        self.worker = OutboxWorker()
+
+    def tearDown(self):
+        email.client = self.original_client
+        email.send_rate_limiter = self.original_limiter
+        self.write_log.stop()
+
+        super().tearDown()
+
+    def queue(self, to_email, name):
+        data = {placeholder: name for placeholder in email.templates.get(self.TEMPLATE).placeholders}
+        queue_email(self.db, self.TEMPLATE, data, to_email, idempotency_key=f'{to_email} {name}')
+        self.db.commit_changes()
+
+    def outbox(self):
+        ''' outbox_id -> (status, attempts) '''
+        self.db.session.expire_all()
+        return {email.outbox_id: (email.status, email.attempts) for email in self.db.session.query(EmailOutbox).all()}
+
+    def sent(self):
+        ''' The emails sent so far, as (recipient, the name they were queued with) '''
+        return [(message['to'][0], message['text'].split(',')[0]) for message in email.client.sent]
+
+    def make_due(self, outbox_id):
+        ''' As if the retry backoff of an email has passed '''
+        self.db.session.execute(update(EmailOutbox).where(EmailOutbox.outbox_id == outbox_id)
+                                                   .values(next_attempt_at=datetime.datetime.now(datetime.timezone.utc)))
+        self.db.commit_changes()
+
+    def test_claim_lease(self):
+        for name in ['first', 'second', 'third']:
+            self.queue(f'{name}@example.com', name)
+
+        # an enqueue of the same email again is a no-op
+        self.queue('first@example.com', 'first')
+        self.assertEqual(len(self.outbox()), 3)
+
+        token, emails = self.db.claim_outbox_emails(2, OutboxWorker.CLAIM_LEASE_SECONDS)
+        self.assertEqual([email.to_emails for email in emails], [['first@example.com'], ['second@example.com']])
+
+        # claimed emails are skipped until their lease is up
+        stale_token, emails = self.db.claim_outbox_emails(10, 0)
+        self.assertEqual([email.to_emails for email in emails], [['third@example.com']])
+
+        # the lease of 0s is up at once, so the email is claimed again and the first claim is stale
+        new_token, emails = self.db.claim_outbox_emails(10, OutboxWorker.CLAIM_LEASE_SECONDS)
+        self.assertEqual([email.to_emails for email in emails], [['third@example.com']])
+        third_id = emails[0].outbox_id
+
+        retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=1)
+        self.db.finish_outbox_emails(stale_token, [(third_id, 'sent', None, True)])
+        self.db.finish_outbox_emails(new_token, [(third_id, 'pending', retry_at, True)])
+        self.db.finish_outbox_emails(token, [(1, 'sent', None, True), (2, 'failed', None, True)])
+
+        self.assertEqual(self.outbox(), {1: ('sent', 1), 2: ('failed', 1), third_id: ('pending', 1)})
+        self.assertEqual(self.db.get_outbox_counts(), {'sent': 1, 'failed': 1, 'pending': 1})
+
+        # nothing is due until the retry
+        self.assertEqual(self.db.claim_outbox_emails(10, OutboxWorker.CLAIM_LEASE_SECONDS)[1], [])
+
+    def test_same_recipients_in_order(self):
+        self.queue('rejected@example.com', 'no')
+        self.queue('rejected@example.com', 'yes')
+        self.queue('other@example.com', 'maybe')
+
+        # the first email fails, so the second one to the same person is held without an attempt
+        self.worker.drain()
+        self.assertEqual(self.outbox(), {1: ('pending', 1), 2: ('pending', 0), 3: ('sent', 1)})
+        self.assertEqual(self.sent(), [('other@example.com', 'maybe')])
+
+        # and it is not claimed while the first one waits for its retry
+        self.worker.drain()
+        self.assertEqual(self.outbox(), {1: ('pending', 1), 2: ('pending', 0), 3: ('sent', 1)})
+
+        # once the retry is due both are sent, in order
+        email.client.reject.clear()
+        self.make_due(1)
+        self.worker.drain()
+
+        self.assertEqual(self.outbox(), {1: ('sent', 2), 2: ('sent', 1), 3: ('sent', 1)})
+        self.assertEqual(self.sent(), [('other@example.com', 'maybe'),
+                                       ('rejected@example.com', 'no'),
+                                       ('rejected@example.com', 'yes')])
+        self.assertEqual((self.worker.sent, self.worker.retried), (3, 1))
+
+    def test_request_send_is_queued_when_throttled(self):
+        # the forgot password handler does not wait for the send rate
+        slept = []
+        email.send_rate_limiter = TokenBucket(10, 10, clock=lambda: 0, sleep=slept.append)
+        email.send_rate_limiter.acquire(10)
+
+        send_forgot_password(self.db, 'forgot@example.com', 'token')
+
+        self.assertEqual(slept, [])
+        self.assertEqual(email.client.sent, [])
+        self.assertEqual([(email.template, email.to_emails) for email in self.db.session.query(EmailOutbox).all()],
+                         [('FORGOT_PASSWORD', ['forgot@example.com'])])
+
+class TeamEmailsTestCase(SqliteTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app(True)
+        cls.client = cls.app.test_client()
+
+    def setUp(self):
+        super().setUp()
+
+        # the handlers use the test db instance, see get_db
+        hockey_db.global_db_instance = self.db
+
+        self.team = self.db.add_team('Ravens', 0)
+        self.captain, self.player = [self.db.add_user(User(email=f'{name}@example.com', first_name=name.capitalize(),
+                                                           created_at=datetime.datetime.now()))
+                                     for name in ['captain', 'player']]
+        self.app.config['TESTING_USER'] = self.captain
+
+    def tearDown(self):
+        hockey_db.global_db_instance = None
+        super().tearDown()
+
+    def post(self, endpoint, data):
+        response = self.client.post(f'/api/{endpoint}', content_type='application/json', data=json.dumps(data))
+        self.assertEqual(response.status_code, 200, response.get_data())
+
+    def set_role(self, role):
+        self.post('player-role', {'team_id': self.team.team_id, 'user_id': self.player.user_id, 'role': role})
+
+    def queued(self):
+        self.db.session.expire_all()
+        return [email.template for email in self.db.session.query(EmailOutbox).order_by(EmailOutbox.outbox_id)]
+
+    def test_team_change_emails(self):
+        # the first player is the captain, the next one asks them to join
+        self.post('join-team', {'team_id': self.team.team_id, 'user_id': self.captain.user_id})
+        self.post('join-team', {'team_id': self.team.team_id, 'user_id': self.player.user_id})
+        self.assertEqual(self.queued(), ['JOIN_REQUEST'])
+
+        # a duplicate of the same request is queued once
+        send_player_join_request(self.db, self.db.get_team_player(self.team.team_id, self.player.user_id), self.team)
+        self.db.commit_changes()
+        self.assertEqual(self.queued(), ['JOIN_REQUEST'])
+
+        # accepting the request is a role change, resubmitting the same role is not
+        self.set_role('full')
+        self.set_role('full')
+        self.assertEqual(self.queued(), ['JOIN_REQUEST', 'ROLE_UPDATED'])
+
+        # a change back to an earlier role is emailed again
+        self.set_role('sub')
+        self.set_role('full')
+        self.assertEqual(self.queued(), ['JOIN_REQUEST'] + ['ROLE_UPDATED'] * 3)
+
+        self.post('remove-player', {'team_id': self.team.team_id, 'user_id': self.player.user_id})
+        self.assertEqual(self.queued(), ['JOIN_REQUEST'] + ['ROLE_UPDATED'] * 3 + ['REMOVED_FROM_TEAM'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+'''
+test_leader
+
+Leader election over the file lock, which is what runs against a database without advisory locks.
+
+To run: python -m unittest webserver.test.test_leader
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+
+from webserver.leader import LeaderElection
+
+class LeaderElectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite://')
+
+        # flock locks belong to the open file, so two electors in one process contend like two workers
+        lock_file = os.path.join(self.directory, 'leader.lock')
+        self.electors = [LeaderElection(engine=self.engine, lock_file=lock_file) for _ in range(2)]
+
+    def tearDown(self):
+        for elector in self.electors:
+            elector.release()
+
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_one_leader(self):
+        first, second = self.electors
+
+        self.assertEqual([first.check(), second.check()], [True, False])
+        self.assertEqual(first.status()['lock'], f'file lock {first.lock_file}')
+
+        # checks keep the same leader
+        self.assertEqual([second.check(), first.check(), second.check()], [False, True, False])
+        self.assertEqual([first.is_leader, second.is_leader], [True, False])
+
+    def test_leader_hands_over(self):
+        first, second = self.electors
+        self.assertTrue(first.check())
+        self.assertFalse(second.check())
+
+        first.release()
+        self.assertFalse(first.is_leader)
+
+        self.assertTrue(second.check())
+        self.assertFalse(first.check())
+        self.assertEqual([first.is_leader, second.is_leader], [False, True])
+
+if __name__ == '__main__':
+    unittest.main()
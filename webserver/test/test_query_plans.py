@@ -0,0 +1,131 @@
+'''
+test_query_plans
+
+Runs EXPLAIN on the queries issued by each hockey_db.Database query method and fails if any of
+them falls back to a sequential scan, which usually means a migration is missing an index.
+Sequential scans are disabled in the planner for the check, so it still picks an index on the
+small test tables whenever one can be used.
+
+To run: python -m unittest webserver.test.test_query_plans
+'''
+import unittest
+
+from sqlalchemy import event
+
+from webserver import create_app
+from webserver.database.hockey_db import get_db, setup_test_db, team_cache, user_cache
+
+class QueryPlanTestCase(unittest.TestCase):
+
+    GAME_TEST_ID = 1
+    LEAGUE_TEST_ID = 1
+    STATS_TEST_SEASON = 60
+    TEAM_TEST_NAME = 'Unit Test'
+    USER_TEST_EMAIL = 'a@b.c'
+
+    # These return whole tables on purpose, a sequential scan is the right plan for them
+    FULL_TABLE_METHODS = ['get_users', 'get_teams', 'get_games', 'get_team_players', 'get_outbox_counts']
+
+    @classmethod
+    def setUpClass(self):
+        self.app = create_app(True)
+
+        setup_test_db()
+        db = get_db()
+
+        self.team = db.get_team(self.TEAM_TEST_NAME)
+        self.user = db.get_user(self.USER_TEST_EMAIL)
+        assert(self.team != None and self.user != None)
+
+    @classmethod
+    def tearDownClass(self):
+        del(self.app)
+
+    def query_method_calls(self):
+        ''' Each Database query method with arguments that exercise its filters '''
+        db = get_db()
+        team_id = self.team.team_id
+        user_id = self.user.user_id
+
+        return {
+            'get_user': lambda: db.get_user(self.USER_TEST_EMAIL),
+            'get_user_by_id': lambda: db.get_user_by_id(user_id),
+            'get_user_by_external_id': lambda: db.get_user_by_external_id(self.user.external_id),
+            'get_user_by_password_reset_token': lambda: db.get_user_by_password_reset_token('token'),
+            'get_team': lambda: db.get_team(self.TEAM_TEST_NAME),
+            'get_team_by_id': lambda: db.get_team_by_id(team_id),
+            'get_teams_by_id': lambda: db.get_teams_by_id([team_id]),
+            'get_notification_rosters': lambda: db.get_notification_rosters([team_id]),
+            'get_team_player': lambda: db.get_team_player(team_id, user_id),
+            'get_games_for_team': lambda: db.get_games_for_team(team_id),
+            'get_games_feed': lambda: db.get_games_feed([team_id], True),
+            'get_game_by_id': lambda: db.get_game_by_id(self.GAME_TEST_ID),
+            'get_games_coming_soon': lambda: db.get_games_coming_soon(),
+            'get_next_game': lambda: db.get_next_game(self.LEAGUE_TEST_ID),
+            'get_next_game_with_placeholder_team': lambda: db.get_next_game_with_placeholder_team(self.LEAGUE_TEST_ID),
+            'get_next_game_without_locker_rooms': lambda: db.get_next_game_without_locker_rooms(),
+            'game_replies_for_game': lambda: db.game_replies_for_game(self.GAME_TEST_ID, team_id),
+            'game_reply_for_game_and_user': lambda: db.game_reply_for_game_and_user(self.GAME_TEST_ID, team_id, user_id),
+            'game_reply_counts': lambda: db.game_reply_counts([self.GAME_TEST_ID], user_id),
+            'get_game_replies_by_user': lambda: db.get_game_replies_by_user([self.GAME_TEST_ID]),
+            'get_game_reply_summary': lambda: db.get_game_reply_summary(self.GAME_TEST_ID, team_id),
+            'get_game_reply_summaries': lambda: db.get_game_reply_summaries([self.GAME_TEST_ID]),
+            'get_page_fetch_states': lambda: db.get_page_fetch_states(['https://stats.sharksice.timetoscore.com/']),
+            'get_stats_season': lambda: db.get_stats_season(self.LEAGUE_TEST_ID),
+            'get_player_stats': lambda: db.get_player_stats(self.LEAGUE_TEST_ID, self.STATS_TEST_SEASON),
+            'get_goalie_stats': lambda: db.get_goalie_stats(self.LEAGUE_TEST_ID, self.STATS_TEST_SEASON, team_id),
+            'get_standings_season': lambda: db.get_standings_season(self.LEAGUE_TEST_ID),
+            'get_standings': lambda: db.get_standings(self.LEAGUE_TEST_ID, self.STATS_TEST_SEASON),
+        }
+
+    def capture_statements(self, call):
+        ''' Runs the query method and returns the (statement, parameters) it executed '''
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        # cached lookups would otherwise be answered without a query
+        team_cache.clear()
+        user_cache.clear()
+        get_db().session.expunge_all()
+
+        engine = get_db().engine
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            call()
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+        return statements
+
+    def explain(self, statement, parameters):
+        connection = get_db().session.connection()
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        plan = connection.exec_driver_sql(f'EXPLAIN {statement}', parameters).fetchall()
+        return '\n'.join(row[0] for row in plan)
+
+    def test_query_methods_use_indexes(self):
+        if get_db().engine.dialect.name != 'postgresql':
+            self.skipTest('query plans are only checked against postgres')
+
+        for name, call in self.query_method_calls().items():
+            with self.subTest(method=name):
+                statements = self.capture_statements(call)
+                self.assertTrue(len(statements) > 0, f'{name} did not issue a query')
+
+                for statement, parameters in statements:
+                    plan = self.explain(statement, parameters)
+                    self.assertNotIn('Seq Scan', plan, f'{name} falls back to a sequential scan:\n{statement}\n{plan}')
+
+        get_db().session.rollback()
+
+    def test_all_query_methods_are_checked(self):
+        ''' New Database query methods must be added to query_method_calls (or FULL_TABLE_METHODS) '''
+        db = get_db()
+        checked = set(self.query_method_calls().keys()) | set(self.FULL_TABLE_METHODS)
+
+        for name in dir(db):
+            if name.startswith('get_') or name.startswith('game_repl'):
+                self.assertIn(name, checked, f'{name} is not covered by the query plan check')
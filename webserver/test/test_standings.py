@@ -0,0 +1,92 @@
+'''
+test_standings
+
+Checks that the standings kept up to date by add_games, one sync at a time, match the standings
+rebuild_standings computes from all of the stored games, through score corrections, shootouts,
+reschedules and results that arrive out of schedule order.
+
+To run: python -m unittest webserver.test.test_standings
+'''
+import datetime
+import unittest
+
+from sqlalchemy import inspect
+
+from webserver.database.alchemy_models import Standing
+from webserver.test.sqlite_db import SqliteTestCase
+from webserver.website_parsers import GameParser
+
+LEAGUE_ID = 1
+SEASON = 60
+LEVEL = 'Adult Division 7B'
+
+class StandingsTestCase(SqliteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.today = datetime.date.today()
+
+    def game(self, game_id, days_ago, home, away, home_goals=None, away_goals=None, game_type='Regular 1'):
+        ''' A GameParser for a game days_ago, completed if it has a score. Shootout goals end in S. '''
+        scheduled_at = self.today - datetime.timedelta(days=days_ago)
+        completed = home_goals is not None
+
+        return GameParser({'Game': f'{game_id}{"*" if completed else ""}',
+                           'Date': scheduled_at.strftime('%a %b %d'),
+                           'Time': '9:45 PM',
+                           'Rink': 'San Jose North',
+                           'League': 'SIAHL@SJ',
+                           'Level': LEVEL,
+                           'Home': home,
+                           'Away': away,
+                           'Home Goals': home_goals if completed else '',
+                           'Away Goals': away_goals if completed else '',
+                           'Type': game_type}, SEASON)
+
+    def standings(self):
+        self.db.session.expire_all()
+        columns = [column.key for column in inspect(Standing).column_attrs if column.key != 'updated_at']
+
+        return sorted(tuple(getattr(standing, column) for column in columns)
+                      for standing in self.db.session.query(Standing).all())
+
+    def sync(self, games):
+        ''' Adds the games like a league sync does, then checks the standings against a rebuild '''
+        self.db.add_games(games, LEAGUE_ID)
+        updated = self.standings()
+
+        self.db.rebuild_standings()
+        self.assertEqual(updated, self.standings())
+
+        return updated
+
+    def test_standings_match_rebuild(self):
+        games = [self.game(1001, 35, 'Ravens', 'Team Beer', '3', '1'),
+                 self.game(1002, 28, 'Team Beer', 'Kraken', '2', '2'),
+                 self.game(1003, 21, 'Kraken', 'Ravens', '4', '2'),
+                 self.game(1004, 14, 'Ravens', 'Kraken'),
+                 self.game(1005, 7, 'Team Beer', 'Ravens', '5', '0', game_type='Playoff'),
+                 self.game(1006, -7, 'Kraken', 'Team Beer')]
+        standings = self.sync(games)
+        self.assertEqual(len(standings), 3)
+
+        # completed out of schedule order, after later games counted
+        games[3] = self.game(1004, 14, 'Ravens', 'Kraken', '1', '0')
+        self.sync(games)
+
+        # a corrected score that flips the result, and a game decided in a shootout
+        games[0] = self.game(1001, 35, 'Ravens', 'Team Beer', '1', '3')
+        games[1] = self.game(1002, 28, 'Team Beer', 'Kraken', '3S', '2')
+        self.sync(games)
+
+        # rescheduled games, moving results across each other
+        games[0] = self.game(1001, 10, 'Ravens', 'Team Beer', '1', '3')
+        games[2] = self.game(1003, 40, 'Kraken', 'Ravens', '4', '2')
+        standings = self.sync(games)
+
+        # and a score taken back, the game is upcoming again
+        games[3] = self.game(1004, 14, 'Ravens', 'Kraken')
+        self.assertNotEqual(self.sync(games), standings)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+'''
+test_sync
+
+Runs league syncs of the Synchronizer against sync_fixtures replay pages and a sqlite db.
+
+To run: python -m unittest webserver.test.test_sync
+'''
+import datetime
+import unittest
+from unittest import mock
+
+from webserver.data_synchronizer import Synchronizer
+from webserver.database.alchemy_models import Game
+from webserver.sync_fixtures import ReplayTransport
+from webserver.test.sqlite_db import SqliteTestCase
+
+LEAGUE_ID = 1
+SEASON = 60
+GAME_COLUMNS = ['Game', 'Date', 'Time', 'Rink', 'League', 'Level', 'Away', 'Goals', 'Home', 'Goals', 'Type']
+
+def season_page(team_names):
+    links = ''.join(f'<a href="display-schedule?team={external_id}&season={SEASON}&league={LEAGUE_ID}">{name}</a>'
+                    for external_id, name in team_names.items())
+    return f'<html><body>{links}</body></html>'
+
+def team_page(games):
+    ''' A team page with a Game Results table. games are dicts with the keys of GameRow '''
+    header = ''.join(f'<th>{column}</th>' for column in GAME_COLUMNS)
+    rows = ''
+    for game in games:
+        scheduled_at = game['scheduled_at']
+        cells = [f'{game["game_id"]}{"*" if game.get("completed") else ""}',
+                 f'{scheduled_at.strftime("%a %b")} {scheduled_at.day}',
+                 scheduled_at.strftime('%I:%M %p').lstrip('0'),
+                 game.get('rink', 'San Jose North'), 'SIAHL@SJ', 'Adult Division 7B',
+                 game['away'], game.get('away_goals', ''), game['home'], game.get('home_goals', ''),
+                 game.get('type', 'Regular 1')]
+        rows += '<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>'
+
+    return f'<html><body><table><tr><th colspan="{len(GAME_COLUMNS)}">Game Results</th></tr>' \
+           f'<tr>{header}</tr>{rows}</table></body></html>'
+
+class SyncTestCase(SqliteTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # whole minutes in the future, the pages have no seconds
+        now = datetime.datetime.now(datetime.timezone.utc).replace(second=0, microsecond=0)
+        self.next_week = now + datetime.timedelta(days=7)
+        self.last_week = now - datetime.timedelta(days=7)
+
+    def sync(self, pages, notify_changes=False):
+        base_url = Synchronizer.SHARKS_ICE_BASE_URL
+        fixture_pages = {f'{base_url}{Synchronizer.SHARKS_ICE_SEASON_ENDPOINT.format(league_id=LEAGUE_ID)}':
+                         season_page({1: 'Ravens', 2: 'Team Beer'})}
+        for external_id, games in pages.items():
+            fixture_pages[f'{base_url}display-schedule?team={external_id}&season={SEASON}&league={LEAGUE_ID}'] = team_page(games)
+
+        synchronizer = Synchronizer(transport=ReplayTransport(self.write_fixture(fixture_pages)), notify_changes=notify_changes)
+        self.assertTrue(synchronizer.sync_league(LEAGUE_ID))
+
+        return synchronizer.metrics_history.runs[-1]
+
+    def game(self, game_id):
+        self.db.session.expire_all()
+        return self.db.session.query(Game).filter(Game.game_id == game_id).one()
+
+    def test_duplicate_games_are_merged(self):
+        ''' Each game is on the pages of both of its teams. Conflicting copies are resolved in favor
+            of the completed copy, then the home team's copy.
+        '''
+        upcoming_home = {'game_id': 1001, 'scheduled_at': self.next_week, 'home': 'Ravens', 'away': 'Team Beer',
+                         'rink': 'San Jose North'}
+        completed_away = {'game_id': 1002, 'scheduled_at': self.last_week, 'home': 'Team Beer', 'away': 'Ravens',
+                          'completed': True, 'home_goals': '2', 'away_goals': '3'}
+
+        metrics = self.sync({
+            1: [upcoming_home, completed_away],
+            # the away team's page has a stale rink, and the home team's page has not posted the score yet
+            2: [dict(upcoming_home, rink='San Jose East'),
+                {key: value for key, value in completed_away.items() if key not in ['completed', 'home_goals', 'away_goals']}]
+        })
+
+        self.assertEqual(metrics.parsed_games, {'parsed': 4, 'duplicates': 2, 'conflicts': 2})
+        self.assertEqual(metrics.games['inserted'], 2)
+        self.assertEqual(self.db.session.query(Game).count(), 2)
+
+        game = self.game(1001)
+        self.assertEqual(game.rink, 'San Jose North')
+        self.assertEqual(game.league_id, LEAGUE_ID)
+
+        game = self.game(1002)
+        self.assertEqual((game.completed, game.home_goals, game.away_goals), (1, 2, 3))
+        self.assertEqual(self.db.get_team_by_id(game.home_team_id).name, 'Team Beer')
+
+    def upcoming_games(self, game_ids):
+        return [{'game_id': game_id, 'scheduled_at': self.next_week + datetime.timedelta(hours=i),
+                 'home': 'Ravens', 'away': 'Team Beer'} for i, game_id in enumerate(game_ids)]
+
+    def test_deleted_games(self):
+        ''' Only the synced league's upcoming games that are gone from the pages are deleted '''
+        past = {'game_id': 1002, 'scheduled_at': self.last_week, 'home': 'Ravens', 'away': 'Team Beer'}
+        games = self.upcoming_games([1001, 1003]) + [past]
+        self.sync({1: games, 2: games})
+
+        # a game of the same team in another league, which this league's pages do not list
+        ravens = self.game(1001).home_team_id
+        self.db.session.add(Game(game_id=2001, scheduled_at=self.next_week, home_team_id=ravens,
+                                 away_team_id=self.game(1001).away_team_id, league_id=LEAGUE_ID + 1))
+        self.db.session.commit()
+
+        # 1001 and the past, not completed, 1002 are gone from the pages
+        games = self.upcoming_games([1003])
+        metrics = self.sync({1: games, 2: games})
+
+        self.assertEqual(metrics.games['deleted'], 1)
+        self.assertEqual({game_id: self.game(game_id).is_deleted for game_id in [1001, 1002, 1003, 2001]},
+                         {1001: True, 1002: False, 1003: False, 2001: False})
+
+    def test_cancelled_games_emails(self):
+        ''' The cancelled games emails are sent unless a sync deletes more than
+            CANCELLED_GAMES_NOTIFY_LIMIT of a team's games, which is more likely a broken page
+        '''
+        games = self.upcoming_games(range(1001, 1008))
+        self.sync({1: games, 2: games})
+
+        with mock.patch('webserver.data_synchronizer.send_games_cancelled') as send_games_cancelled:
+            games = games[:5]
+            metrics = self.sync({1: games, 2: games}, notify_changes=True)
+
+            self.assertEqual(metrics.games['deleted'], 2)
+            self.assertEqual(sorted(game.game_id for game in send_games_cancelled.call_args.args[1]), [1006, 1007])
+
+            send_games_cancelled.reset_mock()
+            games = games[:1]
+            metrics = self.sync({1: games, 2: games}, notify_changes=True)
+
+            self.assertEqual(metrics.games['deleted'], Synchronizer.CANCELLED_GAMES_NOTIFY_LIMIT + 1)
+            send_games_cancelled.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+'''
+test_website_parsers
+
+Checks that the Sharks Ice page parsers give the same results with every html parser backend,
+against the saved team page in webserver/test/team.html.
+
+To run: python -m unittest webserver.test.test_website_parsers
+'''
+import os
+import unittest
+
+from bs4.builder import builder_registry
+
+from webserver.website_parsers import HTML_PARSER_BACKENDS, TeamPageParser, make_soup
+
+TEST_DIR = os.path.dirname(__file__)
+
+class WebsiteParsersTestCase(unittest.TestCase):
+
+    TEAM_PAGE_URL = 'https://stats.sharksice.timetoscore.com/display-schedule?team=1&season=60'
+
+    @classmethod
+    def setUpClass(self):
+        with open(os.path.join(TEST_DIR, 'team.html'), 'r') as f:
+            self.team_html = f.read()
+
+    def parse_team_page(self, backend, only_tag='table'):
+        team_parser = TeamPageParser(self.TEAM_PAGE_URL, make_soup(self.team_html, only_tag, backend))
+        self.assertTrue(team_parser.parse())
+        return team_parser
+
+    def test_team_page(self):
+        team_parser = self.parse_team_page('html.parser')
+
+        self.assertEqual(team_parser.external_id, 1)
+        self.assertEqual(team_parser.season_num, 60)
+        self.assertTrue(len(team_parser.games) > 0)
+        self.assertTrue(len(team_parser.player_stats) > 0)
+
+        for game in team_parser.games:
+            self.assertTrue(game.id > 0)
+            self.assertTrue(game.home_team != '' and game.away_team != '')
+            self.assertEqual(game.season, 60)
+
+    def test_stats_rows(self):
+        team_parser = self.parse_team_page('html.parser')
+
+        players = team_parser.player_stats_rows()
+        self.assertEqual(len(players), len(team_parser.player_stats))
+        for player in players:
+            self.assertTrue(player['name'] != '')
+            self.assertEqual(player['points'], player['goals'] + player['assists'])
+
+        goalies = team_parser.goalie_stats_rows()
+        self.assertEqual(len(goalies), len(team_parser.goalie_stats))
+        for goalie in goalies:
+            self.assertIsInstance(goalie['save_percentage'], float)
+            self.assertTrue(goalie['number'] is None or isinstance(goalie['number'], str))
+
+    def test_backends_parse_identically(self):
+        ''' The reference is html.parser over the whole page, which is how pages were parsed before
+            the table only backends
+        '''
+        reference = self.parse_team_page('html.parser', only_tag=None)
+
+        for backend in HTML_PARSER_BACKENDS:
+            if not builder_registry.lookup(backend):
+                continue
+
+            with self.subTest(backend=backend):
+                team_parser = self.parse_team_page(backend)
+
+                self.assertEqual([game.__dict__ for game in team_parser.games],
+                                 [game.__dict__ for game in reference.games])
+                self.assertEqual(team_parser.player_stats, reference.player_stats)
+                self.assertEqual(team_parser.goalie_stats, reference.goalie_stats)
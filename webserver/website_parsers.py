@@ -10,9 +10,45 @@ import traceback
 from urllib.parse import urlparse
 from zoneinfo import ZoneInfo
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
 from webserver.logging import write_log
 
+# lxml builds the tree several times faster than the pure python html.parser. It is used when it
+# is installed, html.parser is the fallback.
+HTML_PARSER_BACKENDS = ['lxml', 'html.parser']
+
+def html_parser_backend():
+    ''' Returns the fastest of HTML_PARSER_BACKENDS that is installed '''
+    for backend in HTML_PARSER_BACKENDS:
+        if builder_registry.lookup(backend):
+            return backend
+
+    return 'html.parser'
+
+def make_soup(markup, only_tag='table', backend=None):
+    ''' Parses a Sharks Ice page. Only only_tag elements (and their contents) are built into the
+        tree, which is all the parsers look at, so the rest of the page costs no time or memory.
+        Pass only_tag=None for the whole page.
+    '''
+    parse_only = SoupStrainer(only_tag) if only_tag else None
+    return BeautifulSoup(markup, backend if backend else html_parser_backend(), parse_only=parse_only)
+
+def table_rows(table):
+    ''' Returns the contents of each row of a table as lists of strings. Rows with data cells
+        return their <td>s, header rows their <th>s.
+    '''
+    rows = []
+
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        if not cells:
+            cells = row.find_all('th')
+
+        rows.append([cell.get_text().strip() for cell in cells])
+
+    return rows
+
 class TeamPageParser:
 
     GAMES_TABLE = 'Game Results'
@@ -24,6 +60,41 @@ class TeamPageParser:
     TABLE_DATA_COLUMN_HEADERS_INDEX = 1
     TABLE_DATA_START_INDEX = 2
 
+    # stats table column -> (player_stats/goalie_stats db column, type)
+    PLAYER_STATS_COLUMNS = {
+        '#': ('number', str),
+        'GP': ('games_played', int),
+        'Goals': ('goals', int),
+        'Ass.': ('assists', int),
+        'Pts': ('points', int),
+        'PPG': ('power_play_goals', int),
+        'PPA': ('power_play_assists', int),
+        'SHG': ('short_handed_goals', int),
+        'SHA': ('short_handed_assists', int),
+        'GWG': ('game_winning_goals', int),
+        'GWA': ('game_winning_assists', int),
+        'PSG': ('penalty_shot_goals', int),
+        'ENG': ('empty_net_goals', int),
+        'SOG': ('shootout_goals', int),
+        'Hat': ('hat_tricks', int),
+    }
+    GOALIE_STATS_COLUMNS = {
+        '#': ('number', str),
+        'GP': ('games_played', int),
+        'Shots': ('shots', int),
+        'GA': ('goals_against', int),
+        'GAA': ('goals_against_average', float),
+        'Save %': ('save_percentage', float),
+        'SO': ('shutouts', int),
+        'W': ('wins', int),
+        'L': ('losses', int),
+        'OTL': ('overtime_losses', int),
+        'Tie': ('ties', int),
+        'Goals': ('goals', int),
+        'Ass.': ('assists', int),
+        'Pts': ('points', int),
+    }
+
     def __init__(self, url, team_soup):
         self.url = url
         self.soup = team_soup
@@ -43,12 +114,13 @@ class TeamPageParser:
         ''' Finds the important tables in the teams page and initiates parsing of each of them '''
         self.parse_url()
 
-        for table in self.soup.body.find_all('table'):
+        for table in self.soup.find_all('table'):
 
             try:
-                name = self.table_name(table)
+                rows = table_rows(table)
+                name = self.table_name(rows)
                 if name in self.parsers:
-                    self.parsers[name](table)
+                    self.parsers[name](rows)
 
             except Exception as error:
                 write_log('ERROR', f'Failed parsing of {self.url} {traceback.print_exc()}')
@@ -68,40 +140,18 @@ class TeamPageParser:
         except Exception as e:
             write_log('ERROR', f'Failed to parse team external id from page url params {e}') 
 
-    def table_name(self, table):
+    def table_name(self, rows):
         ''' Retrieves the name of the table contained as the only cell in the top row '''
-        rows = table.find_all('tr')
 
         # table title is the only cell of the first row
-        if len(rows[self.TABLE_DATA_NAME_INDEX].find_all('th')) != 1:
+        if len(rows[self.TABLE_DATA_NAME_INDEX]) != 1:
             raise Exception(f'table_name could not be found. Expected 1 cell. '
-                            f'Got {len(rows[self.TABLE_DATA_NAME_INDEX].find_all("th"))}')
-
-        return self.cell_contents(rows[self.TABLE_DATA_NAME_INDEX].th)
-
-    def cell_contents(self, cell):
-        ''' Returns a string with the contents of a table cell, '<th></th>' '''
-        
-        result = cell.get_text()
-        result = result.strip()
+                            f'Got {len(rows[self.TABLE_DATA_NAME_INDEX])}')
 
-        return result
+        return rows[self.TABLE_DATA_NAME_INDEX][0]
 
-    def table_row_contents(self, row):
-        ''' Returns an array with the contents of each cell in the row '''
-
-        result_array = []
-
-        cell_type = 'td' if row.td else 'th'
-
-        for cell in row.find_all(cell_type):
-            result_array.append(self.cell_contents(cell))
-
-        return result_array
-
-    def parse_games(self, table):
-        rows = table.find_all('tr')
-        column_names = self.table_row_contents(rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX])
+    def parse_games(self, rows):
+        column_names = list(rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX])
 
         # adjust duplicate column names of "Goals" to "Home Goals" and "Away Goals"
         for i in range(len(column_names)):
@@ -113,38 +163,54 @@ class TeamPageParser:
                 column_names[i] = f'{column_names[i - 1]} Goals'
 
         self.games = []
-        for row in rows[self.TABLE_DATA_START_INDEX:]:
+        for game_details in rows[self.TABLE_DATA_START_INDEX:]:
 
-            game_details = self.table_row_contents(row)
             game_dict = dict(zip(column_names, game_details))
             game_parser = GameParser(game_dict, self.season_num)
 
             self.games.append(game_parser)
 
-    def parse_players(self, table):
-        rows = table.find_all('tr')
-        column_names = self.table_row_contents(rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX])
+    def parse_players(self, rows):
+        column_names = rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX]
 
         self.player_stats = []
-        for row in rows[self.TABLE_DATA_START_INDEX:]:
+        for player_details in rows[self.TABLE_DATA_START_INDEX:]:
 
-            player_details = self.table_row_contents(row)
             player_dict = dict(zip(column_names, player_details))
 
             self.player_stats.append(player_dict)
 
-    def parse_goalies(self, table):
-        rows = table.find_all('tr')
-        column_names = self.table_row_contents(rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX])
+    def parse_goalies(self, rows):
+        column_names = rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX]
 
         self.goalie_stats = []
-        for row in rows[self.TABLE_DATA_START_INDEX:]:
+        for player_details in rows[self.TABLE_DATA_START_INDEX:]:
 
-            player_details = self.table_row_contents(row)
             player_dict = dict(zip(column_names, player_details))
 
             self.goalie_stats.append(player_dict)
 
+    def player_stats_rows(self):
+        ''' The player stats as dicts of player_stats db columns '''
+        return [self.stats_row(stats, self.PLAYER_STATS_COLUMNS) for stats in self.player_stats]
+
+    def goalie_stats_rows(self):
+        ''' The goalie stats as dicts of goalie_stats db columns '''
+        return [self.stats_row(stats, self.GOALIE_STATS_COLUMNS) for stats in self.goalie_stats]
+
+    def stats_row(self, stats, columns):
+        ''' Converts the values of a stats table row. Blank or malformed numbers become None '''
+        row = {'name': stats.get('Name', '')}
+
+        for column_name, (db_column, value_type) in columns.items():
+            value = stats.get(column_name, '')
+            try:
+                row[db_column] = value_type(value) if value != '' else None
+            except ValueError:
+                row[db_column] = None
+
+        return row
+
 class BaseParser:
     def __init__(self):
         pass
@@ -199,6 +265,7 @@ class GameParser(BaseParser):
         self.home_team = game_dict['Home']
         self.away_team = game_dict['Away']
         self.type = game_dict['Type']
+        self.season = parsed_season_num
         self.home_goals = 0
         self.away_goals = 0
         self.shootout = 0
@@ -286,57 +353,22 @@ class LockerRoomPageParser:
         Returns:
         bool: Always returns True.
         """
-        for table in self.soup.body.find_all('table'):
+        for table in self.soup.find_all('table'):
 
-            self.parse_locker_rooms(table)
+            self.parse_locker_rooms(table_rows(table))
 
         return True
 
-    def cell_contents(self, cell):
-        """
-        Returns a string with the contents of a table cell.
-
-        Args:
-        cell (bs4.Tag): BeautifulSoup tag representing a table cell.
-
-        Returns:
-        str: Contents of the table cell, stripped of any whitespace.
-        """
-        result = cell.get_text()
-        result = result.strip()
-
-        return result
-
-    def table_row_contents(self, row):
-        """
-        Returns an array with the contents of each cell in a table row.
-
-        Args:
-        row (bs4.Tag): BeautifulSoup tag representing a table row.
-
-        Returns:
-        List[str]: List of strings, each representing the contents of a cell in the row.
-        """
-        result_array = []
-
-        cell_type = 'td' if row.td else 'th'
-
-        for cell in row.find_all(cell_type):
-            result_array.append(self.cell_contents(cell))
-
-        return result_array
-
-    def parse_locker_rooms(self, table):
+    def parse_locker_rooms(self, rows):
         """
         Parses the locker room information from the HTML table.
         The locker room information is stored in the dictionary 'self.locker_rooms' with the game ID as the key.
         The game ID maps to a dictionary with keys 'Home LR' and 'Away LR' that contain the corresponding locker room numbers.
 
-        :param table: The BeautifulSoup HTML table element that contains the locker room information.
+        :param rows: The contents of the rows of the HTML table that contains the locker room information, see table_rows.
         :return: None
         """
-        rows = table.find_all('tr')
-        column_names = self.table_row_contents(rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX])
+        column_names = list(rows[self.TABLE_DATA_COLUMN_HEADERS_INDEX])
 
         # adjust duplicate column names of "LR" to "Home LR" and "Away LR"
         for i in range(len(column_names)):
@@ -349,16 +381,18 @@ class LockerRoomPageParser:
                 else:
                     raise Exception(f'Unexpected ordering of games table columns')
 
-        self.games = []
-        for row in rows[self.TABLE_DATA_START_INDEX:]:
+        away_lr_index = column_names.index('Away LR')
+        home_lr_index = column_names.index('Home LR')
+        game_index = column_names.index('Game')
 
-            details = self.table_row_contents(row)
+        self.games = []
+        for details in rows[self.TABLE_DATA_START_INDEX:]:
 
             lr_assignment = {}
-            lr_assignment['Away LR'] = details[column_names.index('Away LR')]
-            lr_assignment['Home LR'] = details[column_names.index('Home LR')]
+            lr_assignment['Away LR'] = details[away_lr_index]
+            lr_assignment['Home LR'] = details[home_lr_index]
 
-            self.locker_rooms[details[column_names.index('Game')]] = lr_assignment
+            self.locker_rooms[details[game_index]] = lr_assignment
 
     def get_locker_rooms_for_game(self, game_id):
         """